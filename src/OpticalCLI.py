@@ -3,7 +3,9 @@ from mininet.cli import CLI
 from mininet.log import error
 import sys
 import os
-import re
+import threading
+
+import numpy as np
 
 from thrift import Thrift
 from thrift.transport import TSocket
@@ -12,13 +14,18 @@ from thrift.protocol import TBinaryProtocol
 from thrift.protocol import TMultiplexedProtocol
 
 sys.path.insert(1, '../behavioral-model/targets/tor_switch')
+sys.path.insert(1, '../behavioral-model/targets/optical_switch')
 sys.path.insert(1, '../behavioral-model/tools')
 from tswitch_CLI import TorSwitchAPI
+from oswitch_CLI import OpticalSwitchAPI
 import runtime_CLI
 
+from schedule import Schedule
+
 class OpticalCLI(CLI):
-    def __init__(self, mininet, stdin=sys.stdin, script=None, **kwargs):
+    def __init__(self, mininet, stdin=sys.stdin, script=None, network=None, **kwargs):
         self.prompt = "Optics-Mininet> "
+        self.network = network
         CLI.__init__(self, mininet, stdin, script, **kwargs)
     
     def get_switches_from_line(self, line):
@@ -50,60 +57,182 @@ class OpticalCLI(CLI):
         result = get_packet_loss_rate_verbose(switches)
         print(result)
 
+    def do_reconfigure(self, line):
+        """reconfigure round_robin|random|latency_optimal|queues|demand FILE [routing]
+        Swap the schedule of the running network, keeping its number of slices and
+        uplinks. queues derives the demand from the current queue lengths, demand reads
+        a traffic matrix. routing is a routing method name like direct or vlb, the last
+        routing function by default."""
+        args = line.split()
+        if self.network is None or len(args) == 0:
+            error("usage: reconfigure round_robin|random|latency_optimal|queues|demand FILE [routing]\n")
+            return
+        network = self.network
+        tor_num, slice_num, uplink_num = network.tor_num(), network.slice_num(), network.schedule.uplink_num
+        kind = args.pop(0)
+        if kind == "round_robin":
+            schedule = Schedule.round_robin(tor_num, uplink_num)
+        elif kind == "random":
+            schedule = Schedule.random(tor_num, slice_num, np.random.default_rng())
+        elif kind == "latency_optimal":
+            schedule = Schedule.latency_optimal(tor_num, uplink_num)
+        elif kind == "queues":
+            readings = get_num_queued_packets_verbose(self.get_switches_from_line(""))
+            schedule = Schedule.from_demand(network.load_demand(readings), slice_num, uplink_num)
+        elif kind == "demand" and len(args) > 0:
+            schedule = Schedule.from_demand(network.load_demand(args.pop(0)), slice_num, uplink_num)
+        else:
+            error(f"Unknown schedule {kind}\n")
+            return
+
+        routing_func = None
+        if len(args) > 0:
+            routing_func = getattr(network, "routing_" + args[0], None)
+            if routing_func is None:
+                error(f"Unknown routing {args[0]}\n")
+                return
+        try:
+            network.reconfigure(schedule, routing_func)
+        except AssertionError as e:
+            error(f"{e}\n")
+
+    def do_set_slice_duration(self, line):
+        """set_slice_duration <duration_us>
+        Change the time slice duration of every switch while the network runs."""
+        args = line.split()
+        if len(args) != 1 or not args[0].isdigit() or int(args[0]) == 0:
+            error("usage: set_slice_duration <duration_us>\n")
+            return
+        if self.network is not None:
+            self.network.set_slice_duration_us(int(args[0]))
+        else:
+            set_slice_duration(self.mn.switches, int(args[0]))
+
+    def do_get_slice_duration(self, line):
+        for switch in self.mn.switches:
+            print(f"{switch.name}: {get_slice_duration(switch)}us")
+
+    def do_telemetry(self, line):
+        """telemetry [raw|1|10] [switches]
+        Latest queued packets and packet loss rate recorded by update_db, as raw samples
+        or averaged over 1s or 10s with their maximum."""
+        args = line.split()
+        store = self.network.telemetry_store if self.network is not None else None
+        if store is None:
+            error("No telemetry is recorded, start the network with use_webserver\n")
+            return
+        resolution = 0
+        if len(args) > 0 and args[0] in ("raw", "1", "10"):
+            resolution = 0 if args[0] == "raw" else int(args[0])
+            args = args[1:]
+        devices = [switch.name for switch in self.get_switches_from_line(" ".join(args))] + ["total"]
+        for device in devices:
+            values = []
+            for metric in ("num_queued_packets", "packet_loss_rate"):
+                points = store.window(metric, device, resolution)
+                if len(points) > 0:
+                    values.append(f"{metric} {points['mean'][-1]:g} (max {points['max'][-1]:g})")
+            if values:
+                print(f"{device}: " + ", ".join(values))
+        print(f"{len(store.series)} series in {store.nbytes() / 2**20:.1f}MB")
+
     def do_test_ping_output(self, line):
         h1 = self.mn.hosts[0]
         h1.popen('ping h2')
         sw = self.mn.get(f"tor_s1_p0")
         print(sw.shell.communicate())
 
-def get_num_queued_packets(switches):
-    num_packets = ""
+class ThriftClientPool():
+    """
+    Persistent clients of the target specific Thrift service (tor_switch or
+    optical_switch) of the switches, keyed by thrift port and shared by the CLI and
+    update_db. A Thrift client is not thread-safe, so every client has its own lock.
+    A call whose connection broke reconnects and is retried once.
+    """
+
+    def __init__(self, thrift_ip="localhost"):
+        self.thrift_ip = thrift_ip
+        self.clients = {}
+        self.lock = threading.Lock()
+
+    def connect(self, switch):
+        api = OpticalSwitchAPI if switch.switch_type() == "optical" else TorSwitchAPI
+        service_name, service_cls = api.get_thrift_services()[0]
+        transport = TTransport.TBufferedTransport(TSocket.TSocket(self.thrift_ip, switch.thrift_port))
+        protocol = TMultiplexedProtocol.TMultiplexedProtocol(TBinaryProtocol.TBinaryProtocol(transport), service_name)
+        transport.open()
+        return service_cls(protocol), transport, threading.Lock()
+
+    def client(self, switch):
+        with self.lock:
+            if switch.thrift_port not in self.clients:
+                self.clients[switch.thrift_port] = self.connect(switch)
+            return self.clients[switch.thrift_port]
+
+    def drop(self, thrift_port):
+        with self.lock:
+            entry = self.clients.pop(thrift_port, None)
+        if entry is not None:
+            entry[1].close()
+
+    def call(self, switch, method, *args):
+        """Result of one RPC of the switch's service."""
+        for attempt in range(2):
+            client, transport, lock = self.client(switch)
+            try:
+                with lock:
+                    return getattr(client, method)(*args)
+            except (TTransport.TTransportException, OSError, EOFError):
+                self.drop(switch.thrift_port)
+                if attempt == 1:
+                    raise
+
+    def close(self):
+        with self.lock:
+            ports = list(self.clients)
+        for thrift_port in ports:
+            self.drop(thrift_port)
+
+client_pool = ThriftClientPool()
+
+def set_slice_duration(switches, duration_us):
     for switch in switches:
-        services = TorSwitchAPI.get_thrift_services()
-        switch_client = runtime_CLI.thrift_connect("localhost", switch.thrift_port, services)[0]
-        num_packets += switch_client.get_num_queued_packets()
-        num_packets += "\n"
-    matches = re.findall(r'total:\s*(-?\d+)', num_packets)
-    total_num_packets = sum(map(int, matches))
-    return total_num_packets
+        if client_pool.call(switch, "set_slice_duration_us", duration_us) != 0:
+            error(f"{switch.name} rejected slice duration {duration_us}us\n")
+
+def get_slice_duration(switch):
+    return client_pool.call(switch, "get_slice_duration_us")
+
+def get_telemetry(switches):
+    """{switch name: Telemetry} of ToR switches, one get_telemetry RPC each."""
+    return {switch.name: client_pool.call(switch, "get_telemetry") for switch in switches}
+
+def queue_depths(telemetry):
+    """{"(port,calendar_queue)": depth, "total": depth} of one Telemetry."""
+    depths = {f"({port},{queue})": depth
+              for port, queues in telemetry.queue_depths.items() for queue, depth in queues.items()}
+    depths["total"] = telemetry.total_queued
+    return depths
+
+def get_num_queued_packets(switches):
+    return sum(telemetry.total_queued for telemetry in get_telemetry(switches).values())
 
 def get_num_queued_packets_verbose(switches):
-    num_packets = {}
-    for switch in switches:
-        services = TorSwitchAPI.get_thrift_services()
-        switch_client = runtime_CLI.thrift_connect("localhost", switch.thrift_port, services)[0]
-        out = switch_client.get_num_queued_packets()
-        # num_packets[switch.name] = out
-        num_packets[switch.name] = {}
-        for line in out.splitlines():
-            match = re.match(r'(\(.*?\)|total):\s*(-?\d+)', line)
-            if match:
-                key = match.group(1)
-                value = int(match.group(2))
-                num_packets[switch.name][key] = value
-    return num_packets
+    return {name: queue_depths(telemetry) for name, telemetry in get_telemetry(switches).items()}
 
-def get_packet_loss_rate(switches):
-    num_pkt_recvd = 0
-    num_pkt_dropped = 0
-    pattern = r"Received: (?P<received>\d+)\nDropped: (?P<dropped>\d+)"
-    for switch in switches:
-        services = TorSwitchAPI.get_thrift_services()
-        switch_client = runtime_CLI.thrift_connect("localhost", switch.thrift_port, services)[0]
-        output = switch_client.get_packet_loss_rate()
-        match = re.search(pattern, output)
-        if match:
-            num_pkt_recvd += int(match.group("received"))
-            num_pkt_dropped += int(match.group("dropped"))
+def packet_loss_rate(telemetries):
+    num_pkt_recvd = sum(telemetry.packets_received for telemetry in telemetries)
+    num_pkt_dropped = sum(telemetry.packets_dropped for telemetry in telemetries)
     if num_pkt_recvd == 0: loss_rate = 0.0
     else: loss_rate = num_pkt_dropped / num_pkt_recvd
     return [num_pkt_recvd, num_pkt_dropped, loss_rate]
 
+def get_packet_loss_rate(switches):
+    return packet_loss_rate(get_telemetry(switches).values())
+
 def get_packet_loss_rate_verbose(switches):
     result = ""
-    for switch in switches:
-        services = TorSwitchAPI.get_thrift_services()
-        switch_client = runtime_CLI.thrift_connect("localhost", switch.thrift_port, services)[0]
-        output = switch_client.get_packet_loss_rate()
-        result += "\n" + switch.name + "\n" + output
-    return result
\ No newline at end of file
+    for name, telemetry in get_telemetry(switches).items():
+        received, dropped, rate = packet_loss_rate([telemetry])
+        result += f"\n{name}\nReceived: {received}\nDropped: {dropped}\nRate: {rate:.6f}"
+    return result
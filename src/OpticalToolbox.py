@@ -1,4 +1,5 @@
 import networkx as nx
+import numpy as np
 import matplotlib.pyplot as plt
 import json
 import os
@@ -6,20 +7,33 @@ import sys
 import random
 import time
 import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
 
 import django
 from django.utils import timezone
 
-import utils
 from OpticalCLI import OpticalCLI
+from routing_index import ConnectivityIndex, PathEngine, VLB_POLICIES
+from route_cache import RouteCache
+from routing_table import HOP_DTYPE, Hop, Path, RoutingTable, SourceRoutes, source_arrays
+from schedule import Schedule
+from table_loader import ThriftTableLoader
+from table_entries import LazyCommands, ProgramNames, cli_text, ip_to_dst_entries, ocs_entries, source_routing_entries, write_json
+from telemetry_sampler import TelemetrySampler
+from telemetry_store import Persister, TelemetryStore
 
 from mininet.net import Mininet
 from mininet.topo import Topo
 from mininet.cli import CLI
 from mininet.link import TCLink
-from p4_mininet import P4Switch, P4Host
+from p4_mininet import P4Switch, P4Host, RUN_PROFILES, plan_cores
+
+# Table sizes declared in p4/tor/tor.p4.
+TOR_TABLE_SIZES = {"source_routing_table": 1024, "ip_to_dst_tor": 512}
+# tor.p4 takes host traffic from this port and delivers to it.
+HOST_PORT = 2
 
-from typing import List
 
 class BaseNetwork():
     """
@@ -27,18 +41,35 @@ class BaseNetwork():
     Includes topology and routing.
     """
 
-    def __init__(self, name, ocs_sw_path, ocs_json_path, ocs_cli_path, tor_sw_path, tor_json_path, tor_cli_path, use_webserver=True):
+    def __init__(self, name, ocs_sw_path, ocs_json_path, ocs_cli_path, tor_sw_path, tor_json_path, tor_cli_path, use_webserver=True, run_profile="debug"):
         self.name = name
-        self.topo = nx.Graph()
-        self.topo_slice = {}
-        self.valid_slice = set()
+        self.schedule = Schedule()
         self.nodes = {}
         self.mininet_topo = None
         self.mininet_net = None
         self.num_hosts = []
         self.ip_to_tor = {}
         self.routing_path = []
+        self.routing_table = None
         self.ssrr_commands = {}
+        self.conn_index = None
+        self.path_engine = None
+        self.vlb_policy = "earliest"
+        self.route_cache = None
+        self.route_cache_key = None
+        self.cached_routing = False
+        self.ocs_loader = None
+        self.tor_loader = None
+        self.routing_func = None
+        self.placement = {}
+        self.pin_threads = False
+        self.run_profiles = {}
+        self.slice_duration_us = None
+        self.sample_period = 1.0
+        self.sampler = None
+        self.persist_resolution = 1
+        self.telemetry_store = None
+        self.set_run_profile(run_profile)
 
         self.ocs_sw_path = ocs_sw_path
         self.ocs_json_path = ocs_json_path
@@ -57,12 +88,27 @@ class BaseNetwork():
 
     def __str__(self) -> str:
         return self.name
+
+    @property
+    def topo(self) -> nx.Graph:
+        """networkx view of every circuit in the schedule, built on demand."""
+        return self.schedule.graph()
+
+    @property
+    def topo_slice(self):
+        """networkx view of every slice (slice -> nx.Graph), built on demand."""
+        return {time_slice: self.schedule.slice_graph(time_slice) for time_slice in range(self.slice_num())}
+
+    @property
+    def valid_slice(self):
+        return set(range(self.schedule.slice_num))
     
     def update_db(self):
         from datetime import datetime
         from io import BytesIO
         from django.core.files.base import ContentFile
-        from dashboardapp.models import Epochs, Readings, PortReadings
+        from django.db import transaction
+        from dashboardapp.models import Epochs, Readings, PortReadings, publish_readings
         sys.path.insert(1, '../behavioral-model/targets/tor_switch')
         sys.path.insert(1, '../behavioral-model/tools')
         from tswitch_CLI import TorSwitchAPI
@@ -94,82 +140,132 @@ class BaseNetwork():
         current_epoch.topo_image.save('graph_slices.png', content_file)
         current_epoch.save()
 
-        from OpticalCLI import get_num_queued_packets, get_num_queued_packets_verbose, get_packet_loss_rate
-        
-        step_count = 0
-        while self.running_db_thread:
-            switches = [switch for switch in self.mininet_net.switches if switch.switch_type() != "optical"]
+        from OpticalCLI import queue_depths, packet_loss_rate
+
+        store = self.telemetry_store = TelemetryStore(persist=(self.persist_resolution,))
+        origin = time.time() // self.persist_resolution * self.persist_resolution
+
+        def write(closed):
+            # The slice a switch was in at the last sample of every bucket.
+            time_slices = {(device, round((bucket_start - origin) / resolution)): int(last)
+                           for resolution, metric, device, bucket_start, _, _, last in closed
+                           if metric == "time_slice"}
+            readings = {}
+            port_readings = []
+            for resolution, metric, device, bucket_start, mean, peak, last in closed:
+                timestep = round((bucket_start - origin) / resolution)
+                if metric == "time_slice":
+                    continue
+                if metric == "port_queued_packets":
+                    device_name, port_key = device
+                    port_readings.append(
+                        PortReadings(device_name=device_name,
+                                     port_key=port_key,
+                                     num_queued_packets=round(mean),
+                                     timestep=timestep,
+                                     timestamp=bucket_start,
+                                     time_slice=time_slices.get((device_name, timestep)),
+                                     epoch=current_epoch)
+                    )
+                else:
+                    reading = readings.setdefault((device, timestep), {"timestamp": bucket_start,
+                                                                       "time_slice": time_slices.get((device, timestep))})
+                    reading[metric] = round(mean) if metric == "num_queued_packets" else mean
+            readings = [Readings(device_name=device_name, timestep=timestep, epoch=current_epoch, **reading)
+                        for (device_name, timestep), reading in sorted(readings.items(), key=lambda item: item[0][1])]
+            # One transaction and one message to the dashboards for everything queued,
+            # bulk_create sends no post_save signal per row.
+            with transaction.atomic():
+                PortReadings.objects.bulk_create(port_readings)
+                Readings.objects.bulk_create(readings)
+            publish_readings(current_epoch, readings)
+
+        persister = Persister(write)
+
+        def on_step(step_count, samples):
+            if len(samples) == 0:
+                return
             total_num_queued_packets = 0
             total_packets_recvd = 0
             total_packets_dropped = 0
-            for switch in switches:
-                device_name = switch.name
+            for sample in samples:
+                device_name = sample.switch
+                telemetry = sample.telemetry
 
-                port_queued_packets = get_num_queued_packets_verbose([switch])
-                port_readings = []
                 num_queued_packets = 0
-                for key, reading in port_queued_packets[switch.name].items():
+                for key, reading in queue_depths(telemetry).items():
                     if key == "total": continue
-                    else:
-                        port_readings.append(
-                            PortReadings(device_name=device_name,
-                                        port_key=key,
-                                        num_queued_packets=reading,
-                                        timestep=step_count,
-                                        epoch=current_epoch)
-                        )
-                        num_queued_packets += reading
-                        total_num_queued_packets += reading
-                PortReadings.objects.bulk_create(port_readings)
+                    store.add("port_queued_packets", (device_name, key), sample.timestamp, reading)
+                    num_queued_packets += reading
+                total_num_queued_packets += num_queued_packets
 
-                packet_loss_rate_values = get_packet_loss_rate([switch])
-                packet_loss_rate = packet_loss_rate_values[2]
-                total_packets_recvd += packet_loss_rate_values[0]
-                total_packets_dropped += packet_loss_rate_values[1]
-                switch_reading = Readings(device_name=device_name, 
-                                          num_queued_packets=num_queued_packets, 
-                                          packet_loss_rate=packet_loss_rate, 
-                                          timestep=step_count, 
-                                          epoch=current_epoch
-                                         )
-                switch_reading.save()
+                received, dropped, switch_loss_rate = packet_loss_rate([telemetry])
+                total_packets_recvd += received
+                total_packets_dropped += dropped
+                store.add("num_queued_packets", device_name, sample.timestamp, num_queued_packets)
+                store.add("packet_loss_rate", device_name, sample.timestamp, switch_loss_rate)
+                store.add("time_slice", device_name, sample.timestamp, sample.time_slice)
 
             if total_packets_recvd == 0: total_packet_loss_rate = 0.0
             else: total_packet_loss_rate = total_packets_dropped / total_packets_recvd
-            total_reading = Readings(device_name='total', 
-                                     num_queued_packets=total_num_queued_packets, 
-                                     packet_loss_rate=total_packet_loss_rate, 
-                                     timestep=step_count, 
-                                     epoch=current_epoch
-                                    )
-            total_reading.save()
-            step_count += 1
-
-            for _ in range(10):
-                if not self.running_db_thread:
-                    break
-                time.sleep(0.1)
-
-    def start(self, mode):
+            timestamp = min(sample.timestamp for sample in samples)
+            store.add("num_queued_packets", "total", timestamp, total_num_queued_packets)
+            store.add("packet_loss_rate", "total", timestamp, total_packet_loss_rate)
+
+            closed = store.take_closed()
+            if closed:
+                persister.submit(closed)
+
+        switches = [switch for switch in self.mininet_net.switches if switch.switch_type() != "optical"]
+        try:
+            self.sampler.run(switches, on_step)
+        finally:
+            # Write what was sampled, however the sampling ended.
+            store.flush()
+            persister.submit(store.take_closed())
+            persister.close()
+            print(self.sampler.report())
+            print(persister.report())
+
+    def start(self, mode, placement = None, cores = None, pin_threads = False):
+        """
+        Start the network in mode "Mininet" or "Testbed".
+        placement pins the BMv2 processes to cores: None (the default) lets them float;
+        "auto" plans a core budget over cores (by default every core available), with
+        the OCS on a dedicated core, see p4_mininet.plan_cores; a {switch name: cpu list}
+        dict is used as is. pin_threads additionally spreads the threads of every switch
+        over its cores.
+        """
         supported_modes = ["Mininet", "Testbed"]
         if mode not in supported_modes:
             assert False, f"Only support modes {supported_modes}"
 
         if mode == "Testbed":
             assert False, "Not implemented"
-        
+
+        self.check_schedule()
+        if placement == "auto":
+            placement = plan_cores(["s1"], [f"tor{tor_id}" for tor_id in range(self.tor_num())], cores)
+            print("Core placement: " + ", ".join(f"{name}={','.join(str(cpu) for cpu in cpus)}"
+                                                 for name, cpus in placement.items()))
+        self.placement = placement or {}
+        self.pin_threads = pin_threads
         self.setup(mode)
         print(f"Started network {self.name} at {mode}.")
 
         if self.use_webserver:
+            self.sampler = TelemetrySampler(self.sample_period)
             db_thread = threading.Thread(target=self.update_db)
             db_thread.start()
 
-        OpticalCLI(self.mininet_net)
+        OpticalCLI(self.mininet_net, network=self)
 
         if self.use_webserver:
             self.running_db_thread = False
+            self.sampler.stop()
             db_thread.join()
+        from OpticalCLI import client_pool
+        client_pool.close()
         self.mininet_net.stop()
     
     def setup(self, mode):
@@ -183,45 +279,80 @@ class BaseNetwork():
         config = self.topo_to_dict()
         self.mininet_topo = Topo()
         thrift_port = 9090 # default thrift port
+
+        # Tables are populated from a pool as soon as each switch is up, while the
+        # others are still starting, see P4Switch.wait_started.
+        table_pool = ThreadPoolExecutor(max_workers=min(8, self.tor_num() + 1))
+        table_loads = {}
+        def on_ready(switch):
+            table_loads[switch.name] = table_pool.submit(self.populate, switch.name)
+
         # Add switches to mininet topology, store metadata in self.nodes dictionary
         s1 = self.mininet_topo.addSwitch('s1',
                                          sw_path=self.ocs_sw_path,
                                          json_path=self.ocs_json_path,
                                          thrift_port=thrift_port,
-                                         pcap_dump=True,
                                          nb_time_slice=self.slice_num(),
-                                         cls=P4Switch)
-        self.nodes['s1'] = {"port_idx": None, "commands": "", "thrift_port": thrift_port}
+                                         on_ready=on_ready,
+                                         cpus=self.placement.get('s1'),
+                                         slice_duration_us=self.slice_duration_us,
+                                         pin_threads=self.pin_threads,
+                                         cls=P4Switch,
+                                         **self.switch_settings('s1'))
+        self.nodes['s1'] = {"port_idx": None, "thrift_port": thrift_port}
         thrift_port += 1
         host_name_counter = 0
-        for tor_id in range(self.topo.number_of_nodes()):
+        for tor_id in range(self.tor_num()):
             tor_switch = self.mininet_topo.addSwitch('tor' + str(tor_id),
                                                      sw_path=self.tor_sw_path,
                                                      json_path=self.tor_json_path,
                                                      thrift_port=thrift_port,
-                                                     pcap_dump=True,
                                                      calendar_queues=self.slice_num(),
-                                                     cls=P4Switch)
-            self.mininet_topo.addLink(s1, tor_switch)
-            self.nodes['tor' + str(tor_id)] = {"tor_id": tor_id, "commands": "", "thrift_port": thrift_port}
+                                                     on_ready=on_ready,
+                                                     cpus=self.placement.get('tor' + str(tor_id)),
+                                                     slice_duration_us=self.slice_duration_us,
+                                                     pin_threads=self.pin_threads,
+                                                     cls=P4Switch,
+                                                     **self.switch_settings('tor' + str(tor_id)))
+            # One OCS port per uplink, see Schedule.ocs_port.
+            for uplink in range(self.schedule.uplink_num):
+                self.mininet_topo.addLink(s1, tor_switch,
+                                          port1=self.schedule.ocs_port(tor_id, uplink) + 1,
+                                          port2=int(self.uplink_port(uplink)))
+            self.nodes['tor' + str(tor_id)] = {"tor_id": tor_id, "thrift_port": thrift_port}
             thrift_port += 1
 
             # Connect hosts to ToR switches
-            for _ in range(self.num_hosts[tor_id]):
+            for host_idx in range(self.num_hosts[tor_id]):
                 ip = f'10.0.{host_name_counter}.1'
                 mac = '00:aa:bb:00:00:%02x' % host_name_counter
                 host = self.mininet_topo.addHost('h' + str(host_name_counter), ip=ip, mac=mac)
                 print(f"h{host_name_counter}: {ip} {mac}")
-                self.mininet_topo.addLink(host, tor_switch, cls=TCLink, bw=1000, loss=0)
+                self.mininet_topo.addLink(host, tor_switch, port2=self.host_port(host_idx), cls=TCLink, bw=1000, loss=0)
                 self.ip_to_tor[ip] = tor_id
                 host_name_counter += 1
         
         for link in self.mininet_topo.links(withKeys=True, withInfo=True):
             print(link)
-        
+
+        # Parse the table entries before the switches start, so that loading only pushes them.
+        self.setup_ocs(config)
+        self.setup_tors()
+
         self.mininet_net = Mininet(self.mininet_topo, host=P4Host, switch=P4Switch, controller=None)
         self.mininet_net.staticArp()
+        start = time.time()
         self.mininet_net.start()
+        started = time.time() - start
+        total = sum(load.result() for load in table_loads.values())
+        table_pool.shutdown()
+        elapsed = max(time.time() - start, 1e-6)
+        slowest = max(self.mininet_net.switches, key=lambda switch: switch.start_time)
+        print(f"Started {len(self.mininet_net.switches)} switches in {started:.2f}s "
+              f"(slowest {slowest.name}: {slowest.start_time:.2f}s)")
+        for switch in self.mininet_net.switches:
+            print(f"  {switch.name}: {switch.start_time:.2f}s")
+        print(f"Populated tables: {total} entries, ready {elapsed:.2f}s after launch")
         #print(self.nodes)
         # populate ARP tables
         host_name_counter = 0
@@ -231,65 +362,88 @@ class BaseNetwork():
             mac = '00:aa:bb:00:00:%02x' % host_name_counter
             h.setARP(ip, mac)
             host_name_counter += 1
-        
-        self.setup_ocs(config)
-        self.setup_tors()
 
     def setup_testbed(self):
         pass
     
     def setup_ocs(self, dict_config):
-        # Generate commands for optical and tor switches for filling their forwarding tables
-        ocs_commands = utils.gen_ocs_commands(dict_config['s1']["slices"])
-        self.nodes['s1']["commands"] = ocs_commands
-        # print(f"ocs commands: {ocs_commands}")
-
-        # Run commands on switches
-        for switch in self.mininet_net.switches:
-            print(f"Populating {switch.name}\'s tables...")
-            with open(f'temp-commands.txt', 'w') as file: file.write(self.nodes[switch.name]['commands'])
-            #with open(f'{switch.name}.txt', 'w') as file: file.write(self.nodes[switch.name]['commands'])
-            if switch.name == 's1':
-                switch.cmd(f"{self.ocs_cli_path} --thrift-port {self.nodes[switch.name]['thrift_port']} < {os.path.abspath('temp-commands.txt')}")
-                #switch.cmd(f"{self.ocs_cli_path} --thrift-port {self.nodes[switch.name]['thrift_port']} < {os.path.abspath(f'{switch.name}.txt')}")
-            else:
-                switch.cmd(f"{self.tor_cli_path} --thrift-port {self.nodes[switch.name]['thrift_port']} < {os.path.abspath('temp-commands.txt')}")
-                #switch.cmd(f"{self.tor_cli_path} --thrift-port {self.nodes[switch.name]['thrift_port']} < {os.path.abspath(f'{switch.name}.txt')}")
-        os.remove('temp-commands.txt')
+        # runtime_CLI holds one program at a time, so the few OCS entries are turned into
+        # Thrift requests now and the ToR program stays loaded while the ToRs populate.
+        self.ocs_loader = ThriftTableLoader(self.ocs_json_path)
+        self.nodes['s1']["requests"] = self.ocs_loader.prepare(ocs_entries(dict_config['s1']["slices"]))
 
     def setup_tors(self):
+        # ToR entries are generated from the routing table while populate streams them.
+        self.tor_loader = ThriftTableLoader(self.tor_json_path)
+        self.tor_loader.use_program()
 
-        ip_to_dst_commands = utils.gen_commands_ip_to_dst(self.ip_to_tor)
-
+    # Attributes replaced by set_schedule, routing and entries.
+    routing_state = ("schedule", "conn_index", "path_engine", "routing_table", "routing_path",
+                     "routing_func", "cached_routing", "route_cache_key", "ssrr_commands")
 
-        for switch in self.mininet_net.switches:
-            if switch.name == 's1':
-                continue
-            elif switch.name.startswith("tor"):
-                tor_id = int(switch.name[3:])
-
-                utils.load_table(cmd = switch.cmd,
-                                cli_path = self.tor_cli_path,
-                                thrift_port = self.nodes[switch.name]['thrift_port'],
-                                table_commands = ip_to_dst_commands,
-                                print_flag=True,
-                                save_flag = False
-                                )
-
-                utils.load_table(cmd = switch.cmd,
-                                cli_path = self.tor_cli_path,
-                                thrift_port = self.nodes[switch.name]['thrift_port'],
-                                table_commands = self.ssrr_commands[tor_id],
-                                print_flag=True,
-                                save_flag = False
-                                )
+    def reconfigure(self, schedule : Schedule, routing_func : callable = None, workers = 1):
+        """
+        Swap the schedule and routing of the running emulation without restarting it.
+        Routes and entries are generated for the new schedule, then only the
+        ocs_schedule and source_routing_table entries that differ from the installed
+        ones are added, modified or deleted over Thrift, on every switch concurrently,
+        while traffic keeps flowing. The ToR, slice and uplink numbers are fixed by the
+        running switches. routing_func defaults to the last one used.
+        Returns (seconds taken by the swap, packets the ToRs dropped meanwhile).
+        """
+        from OpticalCLI import get_packet_loss_rate
+        assert self.mininet_net is not None, "The network is not running"
+        assert (schedule.tor_num, schedule.slice_num, schedule.uplink_num) == \
+            (self.tor_num(), self.slice_num(), self.schedule.uplink_num), \
+            "A live swap keeps the number of ToRs, slices and uplinks"
+        routing_func = routing_func or self.routing_func
+        assert routing_func is not None, "No routing function to route the new schedule"
+
+        problems = schedule.validate()
+        assert not problems, f"Invalid schedule: {problems}"
+        # The switches keep the old schedule until the new one is routed and fits their
+        # tables, so does the network.
+        previous = {key: getattr(self, key) for key in self.routing_state}
+        try:
+            self.set_schedule(schedule)
+            self.routing(routing_func, workers)
+            self.entries()
+        except BaseException:
+            self.__dict__.update(previous)
+            raise
+
+        # Diff every switch before touching them to keep the swap short.
+        changes = {'s1': self.ocs_loader.diff(self.nodes['s1']['thrift_port'],
+                                              ocs_entries(self.topo_to_dict()['s1']["slices"]))}
+        for tor_id in range(self.tor_num()):
+            name = f"tor{tor_id}"
+            changes[name] = self.tor_loader.diff(self.nodes[name]['thrift_port'], self.tor_entries(tor_id))
+
+        tors = [switch for switch in self.mininet_net.switches if switch.switch_type() == "tor"]
+        dropped = get_packet_loss_rate(tors)[1]
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=min(8, len(changes))) as pool:
+            failed = sum(pool.map(lambda name: (self.ocs_loader if name == 's1' else self.tor_loader)
+                                  .push(self.nodes[name]['thrift_port'], changes[name])[1], changes))
+        elapsed = time.time() - start
+        dropped = get_packet_loss_rate(tors)[1] - dropped
+
+        changed = sum(len(requests) for requests in changes.values()) - failed
+        print(f"Reconfigured {self.name}: {changed} entries changed on "
+              f"{sum(1 for requests in changes.values() if requests)} switches in {elapsed:.3f}s, "
+              f"{dropped} packets dropped during the swap" + (f", {failed} failed" if failed else ""))
+        return elapsed, dropped
+
+    def populate(self, name):
+        """Push the table entries of a started switch, returns the number of entries loaded."""
+        if name == 's1':
+            return self.ocs_loader.load(name, self.nodes[name]['thrift_port'], requests=self.nodes[name]["requests"])
+        return self.tor_loader.load(name, self.nodes[name]['thrift_port'], self.tor_entries(self.nodes[name]["tor_id"]))
             
     #Utils
 
     def topo_to_dict(self):
-        dict_representation = dict({"s1": {"slices": []}})
-        for _, graph in self.topo_slice.items():
-            dict_representation["s1"]["slices"].append([t[:-1] for t in nx.to_edgelist(graph)])
+        dict_representation = self.schedule.to_dict()
         #for i in range(0, len(self.topo_slice) + 1):
         #    a = (i // (256 ** 2)) % 256
         #    b = (i // 256) % 256
@@ -297,11 +451,25 @@ class BaseNetwork():
         #    dict_representation["s1"]["port_to_ip"][i] = [f"10.{a}.{c}.{b+1}"]
         return dict_representation
 
+    def host_ip_to_tor(self):
+        """IP of every host mapped to its ToR, numbered the way setup_mininet creates hosts."""
+        ip_to_tor = {}
+        host_id = 0
+        for tor_id, num_hosts in enumerate(self.num_hosts):
+            for _ in range(num_hosts):
+                ip_to_tor[f'10.0.{host_id}.1'] = tor_id
+                host_id += 1
+        return ip_to_tor
+
+    def schedule_signature(self):
+        """Circuits of every slice in a canonical order, as consumed by gen_ocs_commands."""
+        return [sorted(tuple(sorted(edge)) for edge in edges) for edges in self.topo_to_dict()["s1"]["slices"]]
+
     def slice_num(self):
-        return len(self.valid_slice)
+        return self.schedule.slice_num
     
     def tor_num(self):
-        return len(self.topo.nodes())
+        return self.schedule.tor_num
     
     #Topology-related
 
@@ -310,26 +478,24 @@ class BaseNetwork():
         #if tor1 == tor2:
         #    return
 
-        self.topo.add_edge(tor1, tor2, ts = time_slice)
-        if time_slice not in self.valid_slice:
-            self.valid_slice.add(time_slice)
-        
-        if time_slice not in self.topo_slice.keys():
-            self.topo_slice[time_slice] = nx.Graph()
-        self.topo_slice[time_slice].add_edge(tor1, tor2)
+        self.schedule.connect(tor1, tor2, time_slice)
+        self.conn_index = None
+        self.path_engine = None
 
     def connect(self, tor1, port1, tor2, port2, time_slice):
+        """Circuit between uplink port1 of tor1 and uplink port2 of tor2 in time_slice."""
 
         if tor1 == tor2:
             return
 
-        self.topo.add_edge(tor1, tor2, ts = time_slice)
-        if time_slice not in self.valid_slice:
-            self.valid_slice.add(time_slice)
-        
-        if time_slice not in self.topo_slice.keys():
-            self.topo_slice[time_slice] = nx.Graph()
-        self.topo_slice[time_slice].add_edge(tor1, tor2)
+        self.schedule.connect(tor1, tor2, time_slice, port1, port2)
+        self.conn_index = None
+        self.path_engine = None
+
+    def set_schedule(self, schedule : Schedule):
+        self.schedule = schedule
+        self.conn_index = None
+        self.path_engine = None
 
     def topology_random(self, tor_num, num_hosts = []):
         if len(num_hosts) == 0:
@@ -338,13 +504,9 @@ class BaseNetwork():
         assert len(num_hosts) == tor_num
         self.num_hosts = num_hosts
 
-        for slice_id in range(tor_num):
-            remaining_tors = list(range(tor_num))
-            random.shuffle(remaining_tors)
-            while remaining_tors:
-                tor1 = remaining_tors.pop()
-                tor2 = remaining_tors.pop()
-                self.connect(tor1, 0, tor2, 0, slice_id)
+        # Seeded from random so that random.seed keeps schedules reproducible.
+        rng = np.random.default_rng(random.getrandbits(64))
+        self.set_schedule(Schedule.random(tor_num, tor_num, rng))
 
     def round_robin(self, tor_num, num_hosts = []):
         """Create a round-robin topology with the circle method."""
@@ -372,19 +534,7 @@ class BaseNetwork():
         assert len(num_hosts) == tor_num
         self.num_hosts = num_hosts
         
-        group_tors = list(range(group_num))
-        for port_1 in range(port_num):
-            for port_2 in range(port_num):
-                for slice_id in range(group_num-1):   
-                    for i in range(group_num // 2):
-                        self.connect(group_tors[i] + port_1 * group_num, port_1,
-                                     group_tors[-i - 1] + port_2 * group_num, port_2,
-                                     slice_id)
-                    group_tors.insert(1, group_tors.pop(-1))
-                for i in range(group_num):
-                    self.connect(group_tors[i] + port_1 * group_num, port_1,
-                                 group_tors[i] + port_2 * group_num, port_2,
-                                 time_slice = group_num-1)
+        self.set_schedule(Schedule.round_robin(tor_num, port_num))
 
 
     def round_robin_loop(self, tor_num, num_hosts = []):
@@ -393,21 +543,14 @@ class BaseNetwork():
         for generating multiple upper link schedules.
         """
         assert tor_num % 2 == 0, ""
-        tors = list(range(tor_num))
 
         if len(num_hosts) == 0:
             num_hosts = [1] * tor_num
         assert len(num_hosts) == tor_num
         self.num_hosts = num_hosts
 
-        for slice_id in range(tor_num-1):
-            for i in range(tor_num // 2):
-                #Set connection rules
-                self.connect(tors[i], 0, tors[-i-1], 0, slice_id)
-            tors.insert(1, tors.pop(-1))
-
-        for i in range(tor_num):
-            self.connect(tors[i], 0, tors[i], 0, time_slice = tor_num-1)
+        # The self connections of the last slice never become circuits.
+        self.set_schedule(Schedule.round_robin(tor_num, 1))
 
     def opera(self, tor_num, upper_link, num_hosts=[]):
         """Create an Opera topology schedule"""
@@ -431,23 +574,165 @@ class BaseNetwork():
                                  v + v_link_id * base_tor_num, v_link_id,
                                  time_slice = d['ts'])
     
+    def latency_optimal(self, tor_num, upper_link=1, num_hosts=[]):
+        """
+        Shortest schedule in which every ToR pair shares a circuit, for any ToR count
+        and number of upper links, see Schedule.latency_optimal.
+        """
+        if len(num_hosts) == 0:
+            num_hosts = [1] * tor_num
+        assert len(num_hosts) == tor_num
+        self.num_hosts = num_hosts
+
+        self.set_schedule(Schedule.latency_optimal(tor_num, upper_link))
+
+    def topology_from_demand(self, matrix, slices, upper_link=1, num_hosts=[]):
+        """
+        Demand-aware schedule: slices slices whose circuits follow the traffic matrix,
+        see Schedule.from_demand. matrix is a tor_num x tor_num array or nested list,
+        the path of a .npy/.csv/whitespace-separated file, or queue readings as returned
+        by get_num_queued_packets_verbose / queue_readings_from_db.
+        """
+        demand = self.load_demand(matrix)
+        tor_num = demand.shape[0]
+        if len(num_hosts) == 0:
+            num_hosts = [1] * tor_num
+        assert len(num_hosts) == tor_num
+        self.num_hosts = num_hosts
+
+        self.set_schedule(Schedule.from_demand(demand, slices, upper_link))
+
+    def load_demand(self, matrix):
+        if isinstance(matrix, dict):
+            return self.demand_from_queues(matrix)
+        if isinstance(matrix, str):
+            if matrix.endswith(".npy"):
+                return np.load(matrix)
+            return np.loadtxt(matrix, delimiter="," if matrix.endswith(".csv") else None, ndmin=2)
+        return np.asarray(matrix, dtype=np.float64)
+
+    def port_uplink(self, port):
+        """Uplink behind a ToR port, the inverse of uplink_port; -1 for host ports."""
+        if port == 1:
+            return 0
+        uplink = port - HOST_PORT
+        return uplink if 0 < uplink < self.schedule.uplink_num else -1
+
+    def demand_from_queues(self, readings):
+        """
+        Traffic matrix from calendar queue occupancy under the current schedule.
+        readings maps a ToR switch name to {"(port,slice)": queued packets}; packets
+        queued for slice s on an uplink are demand towards the peer of that uplink in s.
+        """
+        demand = np.zeros((self.tor_num(), self.tor_num()))
+        for name, queues in readings.items():
+            if not name.startswith("tor"):
+                continue
+            tor_id = int(name[3:])
+            for key, queued in queues.items():
+                if key == "total":
+                    continue
+                port, time_slice = (int(field) for field in key.strip("()").split(","))
+                uplink = self.port_uplink(port)
+                if uplink < 0 or time_slice >= self.slice_num():
+                    continue
+                peer = self.schedule.peer[time_slice, tor_id, uplink]
+                if peer >= 0:
+                    demand[tor_id, peer] += queued
+        return demand
+
+    def queue_readings_from_db(self, epoch=None):
+        """Per-port queue readings recorded by update_db, summed over the timesteps of epoch (the latest by default)."""
+        from dashboardapp.models import Epochs, PortReadings
+        if epoch is None:
+            epoch = Epochs.objects.latest("id")
+        readings = {}
+        for device_name, port_key, queued in PortReadings.objects.filter(epoch=epoch).values_list(
+                "device_name", "port_key", "num_queued_packets"):
+            queues = readings.setdefault(device_name, {})
+            queues[port_key] = queues.get(port_key, 0) + queued
+        return readings
+
+    def check_schedule(self):
+        """Validate the schedule and print its latency summary, see Schedule.validate and Schedule.analyze."""
+        problems = self.schedule.validate()
+        for problem in problems:
+            print(f"Invalid schedule: {problem}")
+        assert not problems, "The schedule is not a valid matching"
+
+        report = self.schedule.analyze()
+        off_diagonal = ~np.eye(self.tor_num(), dtype=bool)
+        reachable = off_diagonal & (report["max_wait"] >= 0)
+        print(f"Schedule: {self.tor_num()} ToRs, {self.slice_num()} slices, "
+              f"{report['matching_size'].min()}-{report['matching_size'].max()} circuits per slice")
+        if reachable.any():
+            print(f"Wait for a direct circuit: max {report['max_wait'][reachable].max()} slices, "
+                  f"mean {report['mean_wait'][reachable].mean():.2f} slices")
+        if len(report["unreachable"]):
+            pairs = ", ".join(f"{src}-{dst}" for src, dst in report["unreachable"][:8].tolist())
+            print(f"{len(report['unreachable'])} ToR pairs never share a circuit: {pairs}"
+                  f"{', ...' if len(report['unreachable']) > 8 else ''}")
+        return report
+
+    def set_run_profile(self, profile, switches = None, **options):
+        """
+        Select how much the switches trace: "debug" (debugger, per-packet console log,
+        nanolog and pcap), "measure" (warnings only, rotating pcap ring buffers) or
+        "perf" (nothing), see p4_mininet.RUN_PROFILES. The profile applies to the
+        switches named in switches, every switch by default. options override single
+        settings, e.g. pcap_ring=(32, 4) for 4 rotating files of 32MB per port.
+        """
+        assert profile in RUN_PROFILES, f"Run profiles are {list(RUN_PROFILES)}"
+        assert set(options) <= set(RUN_PROFILES[profile]), f"Unknown run profile settings {set(options) - set(RUN_PROFILES[profile])}"
+        settings = dict(RUN_PROFILES[profile], **options)
+        for name in switches or [None]:
+            self.run_profiles[name] = settings
+
+    def switch_settings(self, name):
+        return self.run_profiles.get(name, self.run_profiles[None])
+
     def set_slice_duration_us(self, duration):
-        pass
+        """
+        Duration of a time slice on every switch, in microseconds. Before start it is
+        passed to the switches as a runtime option, while the network runs it is changed
+        over Thrift. The targets default to 32768us.
+        """
+        assert duration > 0, "The slice duration must be positive"
+        self.slice_duration_us = int(duration)
+        if self.mininet_net is not None:
+            from OpticalCLI import set_slice_duration
+            set_slice_duration(self.mininet_net.switches, self.slice_duration_us)
+            print(f"Slice duration set to {self.slice_duration_us}us.")
+
+    def set_sample_period(self, period):
+        """
+        Period in seconds at which update_db samples the telemetry of every ToR, down
+        to 10ms. It can be changed while the network runs.
+        """
+        assert period >= TelemetrySampler.min_period, f"The sampling period must be at least {TelemetrySampler.min_period * 1000:g}ms"
+        self.sample_period = period
+        if self.sampler is not None:
+            self.sampler.set_period(period)
     
     def get_topo(self):
         return self.topo
     
     def get_topo_slice(self, time_slice : int) -> nx.Graph:
         #print(f"Request slice is {time_slice}")
-        return self.topo_slice[time_slice]
-
-        if time_slice not in self.topo_slice.keys():
-            self.topo_slice[time_slice] = nx.Graph(
-                [ (u,v) for u,v,d in self.topo.edges(data=True) if d
-                ['ts'] == time_slice]
-            )
-        return self.topo_slice[time_slice]
+        return self.schedule.slice_graph(time_slice)
     
+    def get_conn_index(self) -> ConnectivityIndex:
+        """Connectivity index of the current schedule, rebuilt after the schedule changes."""
+        if self.conn_index is None:
+            self.conn_index = ConnectivityIndex(self.schedule.conn())
+        return self.conn_index
+
+    def get_path_engine(self) -> PathEngine:
+        """Path cache shared by all routing functions of this network."""
+        if self.path_engine is None:
+            self.path_engine = PathEngine(self.get_conn_index())
+        return self.path_engine
+
     def draw_topo(self):
         pos = nx.circular_layout(sorted(self.topo.nodes))
         fig, axs = plt.subplots(1, self.slice_num())
@@ -472,75 +757,235 @@ class BaseNetwork():
         #Routing-related
     ##########################
             
-    def make_json(tor_id, tor_tb):
-        jsons = []
-        table_name = f"tor{tor_id%4}_pipe.Ingress.tb_forwarding_table"
-        action = "Ingress.enhqueue.set_send_slice_tor"
-
-        for entry in tor_tb:
-            item = {
-                "table_name" : table_name,
-                "action" : action,
-                "key" : {
-                    "time_slice" : entry["time_slice"],
-                    "dst" : entry["dst"],
-                },
-                "data" : {
-                    "send_slice" : entry["send_slice"],
-                    "next_tor" : entry["next_tor"],
-                }
-            }
-            jsons.append(item)
-        
-        with open(f"tables/tor{tor_id}.json", "w") as outfile:
-            json.dump(jsons, outfile, indent=2)
+    def tor_entries(self, tor_id):
+        """Every table entry of a ToR, as TableEntry generated on the fly."""
+        yield from ip_to_dst_entries(self.ip_to_tor or self.host_ip_to_tor())
+        yield from source_routing_entries(self.routing_table, tor_id)
+
+    def make_json(self, tor_id, path=None):
+        """
+        Export the table entries of a ToR as JSON, by default to tables/tor{tor_id}.json.
+        Fields and parameters are named after the tor program, see table_entries.json_entry.
+        """
+        path = path or f"tables/tor{tor_id}.json"
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as outfile:
+            return write_json(self.tor_entries(tor_id), outfile, ProgramNames(self.tor_json_path))
 
     def save_path(self, src, dst, time_slice, path):
         self.routing_path[src].update({(dst,time_slice) : path})
         #print(f"Save Path ({src}->{dst},{time_slice}): {path}")
 
-    def routing(self, routing_func : callable):
-        """Generating routing tables with routing_func"""
-        self.routing_path = [{} for src in self.topo_slice[0].nodes()]
+    def routing(self, routing_func : callable, workers = 1):
+        """
+        Generating routing tables with routing_func.
+        With workers > 1, source ToRs are sharded across a process pool. routing_func
+        must then be a method of this network and the VLB policy a name; workers
+        rebuild it from the compact schedule in routing_worker_state and the merged
+        tables match the serial run.
+        """
+        self.cached_routing = False
+        self.routing_func = routing_func
+        if self.route_cache is not None and self.load_cached_routing(routing_func):
+            return
+
+        self.set_routing_table(RoutingTable(self.tor_num(), self.slice_num()))
+        self.get_conn_index()
+
+        if workers > 1:
+            self.parallel_routing(routing_func, workers)
+            return
+
+        for src in range(self.tor_num()):
+            self.routing_table.set_source(src, *self.source_routes(routing_func, src))
+
+    def set_routing_table(self, table : RoutingTable):
+        self.routing_table = table
+        self.routing_path = [SourceRoutes(table, src) for src in range(table.tor_num)]
+
+    def source_routes(self, routing_func : callable, src):
+        """Paths of src for every (dst, arrival slice) as RoutingTable.set_source arrays."""
+        engine_paths = self.engine_routes(routing_func, src)
+        if engine_paths is not None:
+            hop_num, send_slice, via = engine_paths
+            hop_num = np.where(hop_num > 0, hop_num, -1).T
+            send_slice = send_slice.transpose(1, 0, 2)
+            via = via.transpose(1, 0, 2)
+            hops = np.zeros(send_slice.shape, dtype=HOP_DTYPE)
+            in_path = np.arange(send_slice.shape[-1]) < hop_num[..., None]
+            # Hop k lands on the sender of hop k + 1, the last one on dst.
+            receiver = np.roll(via, -1, axis=-1)
+            last_hop = np.arange(send_slice.shape[-1]) == hop_num[..., None] - 1
+            receiver = np.where(last_hop, np.arange(self.tor_num())[:, None, None], receiver)
+            hops["valid_flag"] = in_path
+            hops["send_slice"] = np.where(in_path, send_slice, 0)
+            hops["send_port"] = np.where(in_path, self.send_port(send_slice, via, receiver), 0)
+            return hop_num, hops
 
         tor_num = self.tor_num()
         slice_num = self.slice_num()
-        for src in range(tor_num):
-            for dst in range(tor_num):
-                if src == dst:
-                    continue
-                for time_slice in range(slice_num):
-                    self.save_path(src, dst, time_slice, routing_func(src, dst, time_slice))
+        paths = {(dst, time_slice): routing_func(src, dst, time_slice)
+                 for dst in range(tor_num) if dst != src for time_slice in range(slice_num)}
+        return source_arrays(paths, tor_num, slice_num)
+
+    def engine_routes(self, routing_func : callable, src):
+        """
+        (hop_num[t, dst], send_slice[t, dst, k], via[t, dst, k]) of src read straight
+        from the path engine when routing_func is one of the built-in routing methods
+        of this network, None for any other routing function.
+        """
+        if getattr(routing_func, "__self__", None) is not self:
+            return None
+        func = routing_func.__func__
+        engine = self.get_path_engine()
+        if func is BaseNetwork.routing_direct:
+            return engine.lookup("direct", src)
+        if func is BaseNetwork.routing_hoho:
+            return engine.lookup("earliest", src, Path.ssrr_len - 1)
+        if func is BaseNetwork.routing_vlb:
+            return engine.lookup("vlb", src, self.vlb_policy)
+        if func is BaseNetwork.routing_opera:
+            hop_num, send_slice, via = engine.lookup("slice", src, Path.ssrr_len - 1)
+            direct_hop_num, direct_send_slice, direct_via = engine.lookup("direct", src)
+            unreached = hop_num == 0
+            hop_num = np.where(unreached, direct_hop_num, hop_num)
+            send_slice = send_slice.copy()
+            via = via.copy()
+            send_slice[unreached] = -1
+            send_slice[unreached, 0] = direct_send_slice[unreached, 0]
+            via[unreached] = -1
+            via[unreached, 0] = direct_via[unreached, 0]
+            return hop_num, send_slice, via
+        return None
+
+    def use_route_cache(self, cache_dir=None, max_bytes=1 << 30):
+        """
+        Reuse routing results across launches. Entries are keyed by the schedule, the
+        host layout and the routing function, see RouteCache. Table entries are
+        generated from the routing table as they are loaded, so they are not cached.
+        """
+        self.route_cache = RouteCache(cache_dir, max_bytes)
+
+    def load_cached_routing(self, routing_func):
+        self.route_cache_key = RouteCache.key(self.schedule_signature(), self.num_hosts,
+                                              RouteCache.routing_identity(routing_func, self.vlb_policy))
+        artifacts = self.route_cache.load(self.route_cache_key)
+        if artifacts is None:
+            return False
+
+        self.set_routing_table(RoutingTable.from_arrays(*artifacts["routing_table"]))
+        self.cached_routing = True
+        print(f"Loaded routing from cache {self.route_cache_key[:12]}.")
+        return True
+
+    def store_cached_routing(self):
+        self.route_cache.store(self.route_cache_key, {
+            "routing_table": (self.routing_table.hop_num, self.routing_table.hops),
+        })
+
+    # Attributes routing functions read, shipped to parallel_routing workers. Subclasses
+    # whose routing methods need more state extend it.
+    routing_worker_attributes = ("name", "schedule", "conn_index", "vlb_policy", "num_hosts", "ip_to_tor")
+
+    def routing_worker_state(self):
+        """
+        Picklable part of the network needed by routing functions, see
+        routing_worker_attributes. Everything else, e.g. the routing table, Mininet, the
+        loaders or the telemetry threads, stays in this process whatever the start method.
+        """
+        return {key: getattr(self, key) for key in self.routing_worker_attributes}
+
+    def parallel_routing(self, routing_func : callable, workers):
+        assert getattr(routing_func, "__self__", None) is self, "Parallel routing needs a routing method of this network"
+        assert isinstance(self.vlb_policy, str), "Parallel routing needs a VLB policy by name, see set_vlb_policy"
+        tor_num = self.tor_num()
+        # A few shards per worker keep the pool busy when sources differ in cost.
+        shard_size = max(1, tor_num // (workers * 4))
+        shards = [list(range(lo, min(lo + shard_size, tor_num))) for lo in range(0, tor_num, shard_size)]
+
+        start = time.time()
+        worker_times = {}
+        with multiprocessing.Pool(workers, initializer=init_routing_worker,
+                                  initargs=(type(self), self.routing_worker_state())) as pool:
+            for pid, elapsed, results in pool.imap_unordered(run_routing_worker,
+                                                             [(routing_func.__name__, shard) for shard in shards]):
+                busy, num_src = worker_times.get(pid, (0.0, 0))
+                worker_times[pid] = (busy + elapsed, num_src + len(results))
+                for src, hop_num, hops in results:
+                    self.routing_table.set_source(src, hop_num, hops)
+        total = time.time() - start
+
+        for pid, (busy, num_src) in sorted(worker_times.items()):
+            print(f"Routing worker {pid}: {num_src} sources in {busy:.2f}s")
+        busy_sum = sum(busy for busy, _ in worker_times.values())
+        print(f"Routed {tor_num} sources with {workers} workers in {total:.2f}s "
+              f"({busy_sum:.2f}s of routing, {busy_sum / total:.1f}x speedup)")
     
+    def uplink_port(self, uplink):
+        """ToR port of an uplink. Uplink 0 keeps port 1, the others come after the host port."""
+        return np.where(uplink == 0, 1, HOST_PORT + uplink)
+
+    def host_port(self, host_idx):
+        """ToR port of the host_idx-th host of a ToR, after the uplinks from the second host on."""
+        return HOST_PORT if host_idx == 0 else HOST_PORT + self.schedule.uplink_num - 1 + host_idx
+
+    def send_port(self, send_slice, sender, receiver):
+        """ToR port of sender whose circuit reaches receiver in send_slice. Arguments broadcast."""
+        return self.uplink_port(self.schedule.uplink_to(send_slice, sender, receiver))
+
     def earliest_direct_conn(self, src, dst, time_slice):
-        wait_slice = 0
-        while (wait_slice < self.slice_num()):
-            current_time_slice = (time_slice + wait_slice) % self.slice_num()
-            for edge in self.get_topo_slice(current_time_slice).edges(dst):
-                if src in edge:
-                    #print(f"edge {edge}")
-                    return Path(src, dst, time_slice, [Hop(current_time_slice, 1)])
-
-            wait_slice += 1
-        return None
+        send_slice = self.get_conn_index().earliest_direct_slice(src, dst, time_slice)
+        if send_slice < 0:
+            return None
+        return Path(src, dst, time_slice, [Hop(send_slice, int(self.send_port(send_slice, src, dst)))])
+
+    def make_path(self, src, dst, time_slice, hops):
+        """Path from the (send slice, sending ToR) of every hop, as returned by PathEngine.hops."""
+        if hops is None:
+            return None
+        receivers = [sender for _, sender in hops[1:]] + [dst]
+        return Path(src, dst, time_slice, [Hop(send_slice, int(self.send_port(send_slice, sender, receiver)))
+                                           for (send_slice, sender), receiver in zip(hops, receivers)])
 
     def earliest_path(self, src, dst, time_slice, hop_limit):
-        assert hop_limit == 1
-        return self.earliest_direct_conn(src, dst, time_slice)
+        # The last SSRR entry always carries the end flag, leaving ssrr_len - 1 hops.
+        assert 1 <= hop_limit < Path.ssrr_len, f"hop_limit must be between 1 and {Path.ssrr_len - 1}"
+        if hop_limit == 1:
+            return self.earliest_direct_conn(src, dst, time_slice)
+        hops = self.get_path_engine().hops("earliest", src, dst, time_slice, hop_limit)
+        return self.make_path(src, dst, time_slice % self.slice_num(), hops)
     
     def routing_direct(self, src, dst, time_slice):
         return self.earliest_path(src, dst, time_slice, hop_limit=1)
-        
+
+    def set_vlb_policy(self, policy):
+        """
+        Select how routing_vlb picks intermediate ToRs:
+        "earliest" | "round_robin" | "hashed" | "least_wait",
+        or a callable (index, srcs) -> via[t, src, dst]. The workers of parallel
+        routing only take the names, a callable policy routes with workers = 1.
+        """
+        assert callable(policy) or policy in VLB_POLICIES, f"Only support VLB policies {list(VLB_POLICIES)}"
+        self.vlb_policy = policy
+
     def routing_vlb(self, src, dst, time_slice):
-        pass
-        #Dummy Path
-        return f"(*,{time_slice}) -> ({dst},*)"
+        hops = self.get_path_engine().hops("vlb", src, dst, time_slice, self.vlb_policy)
+        return self.make_path(src, dst, time_slice % self.slice_num(), hops)
     
     def routing_hoho(self, src, dst, time_slice):
-        pass
+        """Hop-on hop-off: ride whichever circuits reach dst earliest, up to the SSRR hop limit."""
+        return self.earliest_path(src, dst, time_slice, hop_limit=Path.ssrr_len - 1)
     
     def routing_opera(self, src, dst, time_slice):
-        pass
+        """
+        Opera: forward over the expander formed by the circuits of the arrival slice,
+        and wait for the direct circuit when dst is not reachable within it.
+        """
+        hops = self.get_path_engine().hops("slice", src, dst, time_slice, Path.ssrr_len - 1)
+        if hops is None:
+            return self.earliest_direct_conn(src, dst, time_slice)
+        return self.make_path(src, dst, time_slice % self.slice_num(), hops)
 
     def entries(self, lookup_type = "SOURCE"):
         """
@@ -548,8 +993,14 @@ class BaseNetwork():
         lookup_type : "SOURCE" | "PER_HOP"
         """
         if lookup_type == "SOURCE":
-            for src in self.topo.nodes():
-                self.ssrr_commands[src] = self.generate_source_routing_tables(src)
+            # The loaders stream entries from the routing table, the CLI text is only
+            # rendered for the ToRs whose ssrr_commands are read.
+            self.ssrr_commands = LazyCommands(self.generate_source_routing_tables, range(self.tor_num()))
+            overflow = self.plan_tables()
+            assert not overflow, f"Table entries of ToRs {sorted(overflow)} exceed the tor program's tables"
+            # Only routing that fits the tables is worth reusing.
+            if not self.cached_routing and self.route_cache is not None and self.route_cache_key is not None:
+                self.store_cached_routing()
         elif lookup_type == "PER_HOP":
             print(f"PER_HOP is unsupported for now.")
         else:
@@ -557,48 +1008,65 @@ class BaseNetwork():
             exit()
 
     def generate_source_routing_tables(self, src):
-        path = ''
-        commands = ''
-        print(f"src {src}, path {self.routing_path[src]}")
-        for (dst, time_slice), path in self.routing_path[src].items():
-            ssrr = path.ssrr_entry()
-            commands += f"table_add source_routing_table write_ssrr_header {dst} {time_slice} => {ssrr}\n"
-        return commands
-
-
-
-class Hop:
-
-    def __init__(self, send_slice = -1, send_port = -1, valid_flag = 1):
-        self.valid_flag = valid_flag
-        self.send_slice = send_slice
-        self.send_port = send_port
-    
-    def __str__(self):
-        return f"send slice: {self.send_slice}, send port: {self.send_port}"
-    
-    def __repr__(self):
-        return f"{self.valid_flag} {self.send_slice} {self.send_port}"
-    
-
-class Path:
-
-    ssrr_len = 6
-
-    def __init__(self, src, dst, arrival_ts, ssrr : List[Hop]): ##ssrr is a list of HOP
-        self.src = src
-        self.dst = dst
-        self.arrival_ts = arrival_ts
-        self.ssrr = ssrr
-
-    def __str__(self):
-        return f"Path ({self.src}->{self.dst},{self.arrival_ts}): {str(self.ssrr)}"
-    
-    def __repr__(self):
-        return f"Path ({self.src}->{self.dst},{self.arrival_ts}): {str(self.ssrr)}"
-
-    def ssrr_entry(self):
-        pended_ssrr = self.ssrr + [Hop(valid_flag=0) for _ in range(self.ssrr_len - len(self.ssrr))]
-        pended_ssrr[-1].valid_flag = 255 #end flag
-        return " ".join(repr(hop) for hop in pended_ssrr)
-
+        """
+        source_routing_table matches arrival slices by range, see table_entries.source_routing_entries.
+        """
+        return cli_text(source_routing_entries(self.routing_table, src))
+
+    def table_sizes(self):
+        """Sizes of the ToR tables filled by the toolbox, read from the compiled tor program when available."""
+        sizes = dict(TOR_TABLE_SIZES)
+        try:
+            with open(self.tor_json_path) as file:
+                tor_json = json.load(file)
+        except (OSError, ValueError):
+            return sizes
+        for pipeline in tor_json["pipelines"]:
+            for table in pipeline["tables"]:
+                name = table["name"].split(".")[-1]
+                if name in sizes:
+                    sizes[name] = table["max_size"]
+        return sizes
+
+    def plan_tables(self):
+        """
+        Per-ToR entry counts of the generated tables against the table sizes of the tor
+        program. Prints a report and returns {tor: {table: (entries, size)}} of the ToRs
+        whose tables overflow.
+        """
+        sizes = self.table_sizes()
+        ip_to_dst_count = len(self.host_ip_to_tor())
+        routed = (self.routing_table.hop_num >= 0).sum(axis=(1, 2))
+        overflow = {}
+        print(f"{'tor':>5} {'paths':>8} {'source_routing_table':>22} {'ip_to_dst_tor':>15}")
+        for src in range(self.tor_num()):
+            counts = {"source_routing_table": len(self.routing_table.range_runs(src)),
+                      "ip_to_dst_tor": ip_to_dst_count}
+            print(f"{src:>5} {routed[src]:>8} "
+                  f"{counts['source_routing_table']:>10} / {sizes['source_routing_table']:<9} "
+                  f"{counts['ip_to_dst_tor']:>6} / {sizes['ip_to_dst_tor']:<6}")
+            full = {table: (count, sizes[table]) for table, count in counts.items() if count > sizes[table]}
+            if full:
+                overflow[src] = full
+        for src, full in overflow.items():
+            for table, (count, size) in full.items():
+                print(f"tor {src}: {table} needs {count} entries, the tor program holds {size}")
+        return overflow
+
+
+routing_worker_net = None
+
+def init_routing_worker(cls, state):
+    """Rebuild a routing-only network in a pool worker."""
+    global routing_worker_net
+    routing_worker_net = cls.__new__(cls)
+    routing_worker_net.__dict__.update(state)
+    routing_worker_net.path_engine = None
+
+def run_routing_worker(task):
+    func_name, srcs = task
+    start = time.time()
+    net = routing_worker_net
+    routing_func = getattr(net, func_name)
+    results = [(src, *net.source_routes(routing_func, src)) for src in srcs]
+    return os.getpid(), time.time() - start, results
@@ -54,3 +54,10 @@ class ReadingsConsumer(AsyncWebsocketConsumer):
             'packet_loss_rate': message['packet_loss_rate']
         }))
 
+    async def send_batch(self, event):
+        message = event['message']
+        await self.send(text_data=json.dumps({
+            'epoch': message['epoch'],
+            'readings': message['readings']
+        }))
+
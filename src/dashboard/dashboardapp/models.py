@@ -1,6 +1,4 @@
 from django.db import models
-from django.db.models.signals import post_save
-from django.dispatch import receiver
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
 import os
@@ -15,6 +13,8 @@ class Readings(models.Model):
     num_queued_packets = models.IntegerField()
     packet_loss_rate = models.FloatField()
     timestep = models.IntegerField()
+    timestamp = models.FloatField(null=True)
+    time_slice = models.IntegerField(null=True)
     epoch = models.ForeignKey(Epochs, on_delete=models.CASCADE, related_name='readings')
 
 class PortReadings(models.Model):
@@ -22,20 +22,30 @@ class PortReadings(models.Model):
     port_key = models.CharField(max_length=100)
     num_queued_packets = models.IntegerField()
     timestep = models.IntegerField()
+    timestamp = models.FloatField(null=True)
+    time_slice = models.IntegerField(null=True)
     epoch = models.ForeignKey(Epochs, on_delete=models.CASCADE, related_name='portreadings')
 
-@receiver(post_save, sender=Readings)
-def new_reading(sender, instance: Readings, **kwargs):
+def publish_readings(epoch: Epochs, readings):
+    """Push the readings written in one step to the dashboards as a single message."""
+    if len(readings) == 0:
+        return
     channel_layer = get_channel_layer()
     async_to_sync(channel_layer.group_send)(
         'reading_updates',
         {
-            'type': 'send_update',
+            'type': 'send_batch',
             'message': {
-                'epoch': instance.epoch.id,
-                'device_name': instance.device_name,
-                'num_queued_packets': instance.num_queued_packets,
-                'packet_loss_rate': instance.packet_loss_rate
+                'epoch': epoch.id,
+                'readings': [
+                    {
+                        'device_name': reading.device_name,
+                        'timestep': reading.timestep,
+                        'num_queued_packets': reading.num_queued_packets,
+                        'packet_loss_rate': reading.packet_loss_rate
+                    }
+                    for reading in readings
+                ]
             }
         }
     )
\ No newline at end of file
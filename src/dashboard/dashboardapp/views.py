@@ -16,7 +16,7 @@ def render_dashboard(request):
     devices = list(Readings.objects.values_list('device_name', flat=True).distinct())
 
     metrics = [field.name for field in Readings._meta.get_fields()]
-    excluded_metrics = {'device_name', 'id', 'timestep', 'epoch'}
+    excluded_metrics = {'device_name', 'id', 'timestep', 'timestamp', 'time_slice', 'epoch'}
     metrics = [field for field in metrics if field not in excluded_metrics]
 
     readings = {}
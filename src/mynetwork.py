@@ -20,6 +20,9 @@ if __name__ == "__main__":
     # net.topology_random(tor_num = 8, num_hosts=[8, 1, 9, 1, 3, 6, 2, 4])
     # net.draw_topo()
 
+    # Skip route computation and table generation when nothing changed since the last launch
+    net.use_route_cache()
+
     net.routing(routing_func = net.routing_direct)
     net.entries(lookup_type="SOURCE")
     
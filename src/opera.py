@@ -0,0 +1,16 @@
+from OpticalToolbox import BaseNetwork
+
+if __name__ == "__main__":
+    root=""
+    net = BaseNetwork(name="opera",
+                      ocs_sw_path=f"{root}/openoptics-mininet/behavioral-model/targets/optical_switch/optical_switch",
+                      ocs_json_path=f"{root}/openoptics-mininet/p4/ocs/ocs.json",
+                      ocs_cli_path=f"{root}/openoptics-mininet/behavioral-model/targets/simple_switch/runtime_CLI",
+                      tor_sw_path=f"{root}/openoptics-mininet/behavioral-model/targets/tor_switch/tor_switch",
+                      tor_json_path=f"{root}/openoptics-mininet/p4/tor/tor.json",
+                      tor_cli_path=f"{root}/openoptics-mininet/behavioral-model/targets/simple_switch/runtime_CLI",
+                      use_webserver=False)
+    net.opera(tor_num = 8, upper_link = 2)
+    net.routing(net.routing_opera)
+    net.entries(lookup_type="SOURCE")
+    net.start(mode = "Mininet")
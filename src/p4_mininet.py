@@ -15,12 +15,13 @@
 
 from mininet.net import Mininet
 from mininet.node import Switch, Host
-from mininet.log import setLogLevel, info, error, debug
+from mininet.log import setLogLevel, info, error, debug, warn
 from mininet.moduledeps import pathCheck
 from sys import exit
 import os
 import tempfile
 import socket
+import time
 
 class P4Host(Host):
     def config(self, **params):
@@ -49,6 +50,47 @@ class P4Host(Host):
         ))
         print("**********")
 
+# P4Switch settings of the run profiles, selected with BaseNetwork.set_run_profile.
+# pcap_ring is (file size in MB, number of files) of the rotating capture of every data port.
+RUN_PROFILES = {
+    # Every packet traced to /tmp/p4s.<name>.log and dumped to pcap, debugger and event log on.
+    "debug": {"enable_debugger": True, "log_console": True, "log_level": None,
+              "nanolog": True, "pcap_dump": True, "pcap_ring": None},
+    # Warnings only, packets captured into size-bounded rotating pcap files.
+    "measure": {"enable_debugger": False, "log_console": True, "log_level": "warn",
+                "nanolog": False, "pcap_dump": False, "pcap_ring": (64, 8)},
+    # Throughput experiments: no tracing of any kind.
+    "perf": {"enable_debugger": False, "log_console": False, "log_level": "off",
+             "nanolog": False, "pcap_dump": False, "pcap_ring": None},
+}
+
+def plan_cores(ocs, tors, cores = None, ocs_cores = 1):
+    """Core budget of the BMv2 processes: {switch name: sorted cpu list}.
+    The OCS switches share ocs_cores dedicated cores. The remaining cores are split
+    into contiguous sets of (nearly) equal size, one per ToR, so that the polling
+    egress_cq_thread of a ToR never competes with another ToR. When ToRs outnumber
+    the remaining cores they share them round-robin, with a warning.
+    cores defaults to the cores this process may run on."""
+    if cores is None:
+        cores = os.sched_getaffinity(0)
+    cores = sorted(cores)
+    if len(ocs) == 0:
+        ocs_cores = 0
+    if len(cores) <= ocs_cores:
+        warn("{} cores cannot keep {} for the OCS, every switch shares them.\n".format(len(cores), ocs_cores))
+        return {name: cores for name in list(ocs) + list(tors)}
+
+    plan = {name: cores[:ocs_cores] for name in ocs}
+    tor_cores = cores[ocs_cores:]
+    if len(tors) > len(tor_cores):
+        warn("{} ToRs share {} cores, slice timing may drift.\n".format(len(tors), len(tor_cores)))
+        for idx, name in enumerate(tors):
+            plan[name] = [tor_cores[idx % len(tor_cores)]]
+        return plan
+    for idx, name in enumerate(tors):
+        plan[name] = tor_cores[idx * len(tor_cores) // len(tors):(idx + 1) * len(tor_cores) // len(tors)]
+    return plan
+
 class P4Switch(Switch):
     """P4 virtual switch"""
     device_id = 0
@@ -62,6 +104,13 @@ class P4Switch(Switch):
                  enable_debugger = True,
                  calendar_queues = 0,
                  nb_time_slice = 1,
+                 on_ready = None,
+                 cpus = None,
+                 pin_threads = False,
+                 log_level = None,
+                 nanolog = True,
+                 pcap_ring = None,
+                 slice_duration_us = None,
                  **kwargs):
         Switch.__init__(self, name, **kwargs)
         assert(sw_path)
@@ -83,6 +132,17 @@ class P4Switch(Switch):
         self.log_console = log_console
         self.calendar_queues = calendar_queues
         self.nb_time_slice = nb_time_slice
+        self.on_ready = on_ready
+        self.cpus = cpus
+        self.pin_threads = pin_threads
+        self.log_level = log_level
+        self.nanolog = nanolog
+        self.pcap_ring = pcap_ring
+        self.slice_duration_us = slice_duration_us
+        self.pcap_pids = []
+        self.pid = None
+        self.launch_time = None
+        self.start_time = None
         if device_id is not None:
             self.device_id = device_id
             P4Switch.device_id = max(P4Switch.device_id, device_id)
@@ -95,27 +155,99 @@ class P4Switch(Switch):
     def setup(cls):
         pass
 
-    def check_switch_started(self, pid):
-        """While the process is running (pid exists), we check if the Thrift
-        server has been started. If the Thrift server is ready, we assume that
-        the switch was started successfully. This is only reliable if the Thrift
-        server is started at the end of the init process"""
-        while True:
-            if not os.path.exists(os.path.join("/proc", str(pid))):
-                return False
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    @classmethod
+    def batchStartup(cls, switches):
+        "Called by Mininet once every switch is launched"
+        started = cls.wait_started(switches)
+        if len(started) < len(switches):
+            exit(1)
+        return started
+
+    def thrift_ready(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(0.5)
+            return sock.connect_ex(("localhost", self.thrift_port)) == 0
+        finally:
+            sock.close()
+
+    def check_started(self):
+        """None while the switch is starting, then whether it started. While the
+        process is running (pid exists), we check if the Thrift server has been
+        started. If the Thrift server is ready, we assume that the switch was
+        started successfully. This is only reliable if the Thrift server is started
+        at the end of the init process"""
+        if not os.path.exists(os.path.join("/proc", str(self.pid))):
+            return False
+        if self.thrift_ready():
+            return True
+        return None
+
+    def check_switch_started(self, pid, timeout = 60):
+        """Wait until the switch started, polling with a bounded backoff."""
+        self.pid = pid
+        if self.launch_time is None:
+            self.launch_time = time.time()
+        return self in P4Switch.wait_started([self], timeout)
+
+    @staticmethod
+    def wait_started(switches, timeout = 60):
+        """Wait for launched switches together: each round polls every pending
+        switch once, then sleeps with an exponential backoff capped at 100ms.
+        A switch's on_ready callback runs as soon as it is up, while the others
+        are still starting. Returns the switches that started."""
+        pending = list(switches)
+        started = []
+        delay = 0.001
+        deadline = time.time() + timeout
+        while pending:
+            for switch in list(pending):
+                status = switch.check_started()
+                if status is None:
+                    continue
+                pending.remove(switch)
+                if not status:
+                    error("P4 switch {} did not start correctly.\n".format(switch.name))
+                    continue
+                switch.start_time = time.time() - switch.launch_time
+                info("P4 switch {} has been started in {:.2f}s.\n".format(switch.name, switch.start_time))
+                started.append(switch)
+                if switch.pin_threads and switch.cpus:
+                    switch.pin_thread_cores()
+                if switch.on_ready is not None:
+                    switch.on_ready(switch)
+            if not pending:
+                break
+            if time.time() > deadline:
+                for switch in pending:
+                    error("P4 switch {} did not start within {}s.\n".format(switch.name, timeout))
+                break
+            time.sleep(delay)
+            delay = min(2 * delay, 0.1)
+        return started
+
+    def pin_thread_cores(self):
+        """Spread the threads of the running switch over its cpus, one cpu per thread."""
+        task_dir = os.path.join("/proc", str(self.pid), "task")
+        try:
+            tids = sorted(int(tid) for tid in os.listdir(task_dir))
+        except OSError:
+            return
+        for idx, tid in enumerate(tids):
             try:
-                sock.settimeout(0.5)
-                result = sock.connect_ex(("localhost", self.thrift_port))
-            finally:
-                sock.close()
-            if result == 0:
-                return  True
+                os.sched_setaffinity(tid, {self.cpus[idx % len(self.cpus)]})
+            except OSError:
+                pass
+        debug("P4 switch {} threads {} pinned to cpus {}.\n".format(self.name, tids, self.cpus))
 
     def start(self, controllers):
-        "Start up a new P4 switch"
+        """Launch a new P4 switch. Mininet waits for every launched switch in
+        batchStartup, so the switches start concurrently."""
         info("Starting P4 switch {}.\n".format(self.name))
         args = [self.sw_path]
+        if self.cpus:
+            # Threads inherit the affinity, see plan_cores.
+            args = ['taskset', '-c', ','.join(str(cpu) for cpu in self.cpus)] + args
         for port, intf in self.intfs.items():
             if not intf.IP():
                 args.extend(['-i', str(port) + "@" + intf.name])
@@ -124,7 +256,7 @@ class P4Switch(Switch):
             # args.append("--useFiles")
         if self.thrift_port:
             args.extend(['--thrift-port', str(self.thrift_port)])
-        if self.nanomsg:
+        if self.nanomsg and self.nanolog:
             args.extend(['--nanolog', self.nanomsg])
         args.extend(['--device-id', str(self.device_id)])
         P4Switch.device_id += 1
@@ -133,30 +265,47 @@ class P4Switch(Switch):
             args.append("--debugger")
         if self.log_console:
             args.append("--log-console")
+        if self.log_level:
+            args.extend(["--log-level", self.log_level])
         if self.name.startswith("tor"):
             args.extend(["-- --calendar-queues", str(self.calendar_queues)])
         elif self.name.startswith("s"):
             args.extend(["-- --time-slices", str(self.nb_time_slice)])
+        if self.slice_duration_us and self.switch_type() != "default":
+            args.extend(["--slice-duration-us", str(self.slice_duration_us)])
         
         logfile = "/tmp/p4s.{}.log".format(self.name)
         info(' '.join(args) + "\n")
 
-        pid = None
+        self.launch_time = time.time()
         with tempfile.NamedTemporaryFile() as f:
             # self.cmd(' '.join(args) + ' > /dev/null 2>&1 &')
             self.cmd('echo' + ' '.join(args) + '>' + logfile)
             self.cmd(' '.join(args) + ' >' + logfile + ' 2>&1 & echo $! >> ' + f.name)
-            pid = int(f.read())
-        debug("P4 switch {} PID is {}.\n".format(self.name, pid))
-        if not self.check_switch_started(pid):
-            error("P4 switch {} did not start correctly.\n".format(self.name))
-            exit(1)
-        info("P4 switch {} has been started.\n".format(self.name))
+            self.pid = int(f.read())
+        debug("P4 switch {} PID is {}.\n".format(self.name, self.pid))
+        if self.pcap_ring:
+            self.start_pcap_ring()
+
+    def start_pcap_ring(self):
+        """Capture every data port into pcap_ring = (MB, files) rotating files /tmp/p4s.<name>.<intf>.pcap<n>."""
+        file_mb, files = self.pcap_ring
+        with tempfile.NamedTemporaryFile() as f:
+            for port, intf in self.intfs.items():
+                if intf.IP():
+                    continue
+                pcap = "/tmp/p4s.{}.{}.pcap".format(self.name, intf.name)
+                self.cmd('tcpdump -i {} -w {} -C {} -W {} -U > /dev/null 2>&1 & echo $! >> {}'.format(
+                    intf.name, pcap, file_mb, files, f.name))
+            self.pcap_pids = [int(pid) for pid in f.read().split()]
 
     def stop(self):
         "Terminate P4 switch."
         self.output.flush()
-        self.cmd('kill %' + self.sw_path)
+        if self.pcap_pids:
+            self.cmd('kill ' + ' '.join(str(pid) for pid in self.pcap_pids))
+        # The job of a pinned switch starts with taskset, kill it by pid.
+        self.cmd('kill ' + str(self.pid) if self.pid else 'kill %' + self.sw_path)
         self.cmd('wait')
         self.deleteIntfs()
 
@@ -0,0 +1,126 @@
+import hashlib
+import inspect
+import os
+import pickle
+import sys
+import zlib
+
+import routing_index
+import routing_table
+
+class RouteCache():
+    """
+    Content-addressed on-disk cache of routing results.
+
+    Entries are keyed by a hash of the schedule, the host layout and the identity of
+    the routing function (its code, parameters and the source of the modules its
+    routes come from), and stored as one zlib-compressed pickle per key.
+    Loading an entry marks it as recently used; evict() drops the least recently used
+    entries once the cache grows past max_bytes.
+    """
+
+    magic = b"OMRC1\n"
+    suffix = ".rcache"
+
+    def __init__(self, cache_dir=None, max_bytes=1 << 30):
+        if cache_dir is None:
+            cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".route_cache")
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def code_identity(func):
+        """
+        Bytes identifying the code of a function: its bytecode, constants, names,
+        defaults and closure, so that two lambdas only match when they compute the same.
+        """
+        func = getattr(func, "__func__", func)
+        code = getattr(func, "__code__", None)
+        if code is None:
+            return getattr(func, "__qualname__", repr(func)).encode()
+        closure = [cell.cell_contents for cell in func.__closure__ or ()]
+        return b"\0".join([func.__qualname__.encode(), code.co_code,
+                            repr((code.co_consts, code.co_names, func.__defaults__, closure)).encode()])
+
+    @staticmethod
+    def routing_identity(routing_func, *params):
+        """
+        Code and parameters of a routing function and the source of the modules its
+        routes come from.
+        """
+        func = getattr(routing_func, "__func__", routing_func)
+        modules = {func.__module__, routing_index.__name__, routing_table.__name__}
+        owner = getattr(routing_func, "__self__", None)
+        if owner is not None:
+            modules.update(cls.__module__ for cls in type(owner).__mro__)
+        digest = hashlib.sha256(RouteCache.code_identity(func))
+        for param in params:
+            digest.update(RouteCache.code_identity(param) if callable(param) else repr(param).encode())
+        for name in sorted(modules):
+            path = getattr(sys.modules.get(name), "__file__", None)
+            if path is not None and os.path.isfile(path):
+                with open(path, "rb") as file:
+                    digest.update(file.read())
+        return digest.hexdigest()
+
+    @staticmethod
+    def key(*parts):
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(part if isinstance(part, bytes) else repr(part).encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + self.suffix)
+
+    def load(self, key):
+        """Cached artifacts for key, None on a miss or an unreadable entry."""
+        path = self.path(key)
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+            if not data.startswith(self.magic):
+                return None
+            artifacts = pickle.loads(zlib.decompress(data[len(self.magic):]))
+        except (OSError, zlib.error, pickle.UnpicklingError, EOFError):
+            return None
+        os.utime(path)
+        return artifacts
+
+    def store(self, key, artifacts):
+        path = self.path(key)
+        data = self.magic + zlib.compress(pickle.dumps(artifacts, protocol=pickle.HIGHEST_PROTOCOL))
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as file:
+            file.write(data)
+        os.replace(temp_path, path)
+        self.evict()
+
+    def entries(self):
+        """(path, size, last use) of every cached entry, least recently used first."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(self.suffix):
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((os.path.join(self.cache_dir, name), stat.st_size, stat.st_mtime))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def invalidate(self, key=None):
+        """Drop the entry for key, or every entry when key is None."""
+        paths = [self.path(key)] if key is not None else [path for path, _, _ in self.entries()]
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def evict(self, max_bytes=None):
+        """Drop least recently used entries until the cache fits in max_bytes."""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= max_bytes:
+                break
+            os.remove(path)
+            total -= size
@@ -0,0 +1,401 @@
+from collections import OrderedDict
+
+import numpy as np
+
+UNREACHED = np.iinfo(np.int32).max // 2
+
+def vlb_earliest(index, srcs):
+    """Intermediate on the first circuit leaving src."""
+    wait = index.wait[:, srcs, :].astype(np.int32)
+    wait[:, np.arange(len(srcs)), srcs] = UNREACHED
+    order = np.argsort(wait, axis=2, kind="stable")[:, :, :2]
+    # Skip the first peer when it is the destination itself.
+    dst = np.arange(index.tor_num)
+    return np.where(order[:, :, :1] == dst, order[:, :, 1:2], order[:, :, :1])
+
+def _nth_intermediate(k, srcs, tor_num):
+    """k-th ToR in 0..tor_num-1 once src and dst are left out."""
+    dst = np.arange(tor_num)
+    low = np.minimum(srcs[:, None], dst)
+    high = np.maximum(srcs[:, None], dst)
+    k = k + (k >= low)
+    return k + (k >= high)
+
+def vlb_round_robin(index, srcs):
+    """Rotate through all intermediates as the arrival slice advances."""
+    slices = np.arange(index.slice_num).reshape(-1, 1, 1)
+    dst = np.arange(index.tor_num)
+    k = (slices + dst) % max(index.tor_num - 2, 1)
+    return _nth_intermediate(k, srcs, index.tor_num)
+
+def vlb_hashed(index, srcs):
+    """Spread (src, dst, slice) over intermediates with a multiplicative hash."""
+    slices = np.arange(index.slice_num, dtype=np.uint64).reshape(-1, 1, 1)
+    src = srcs.astype(np.uint64)[:, None]
+    dst = np.arange(index.tor_num, dtype=np.uint64)
+    key = (src * np.uint64(73856093)) ^ (dst * np.uint64(19349663)) ^ (slices * np.uint64(83492791))
+    key = (key * np.uint64(0x9E3779B1)) >> np.uint64(16)
+    k = (key % np.uint64(max(index.tor_num - 2, 1))).astype(np.int64)
+    return _nth_intermediate(k, srcs, index.tor_num)
+
+def vlb_least_wait(index, srcs):
+    """Intermediate with the earliest second hop into dst."""
+    slices = np.arange(index.slice_num).reshape(-1, 1, 1)
+    tors = np.arange(index.tor_num)
+    best = np.full((index.slice_num, len(srcs), index.tor_num), UNREACHED, dtype=np.int32)
+    choice = np.zeros(best.shape, dtype=np.int64)
+    # One intermediate at a time keeps a running minimum, not a slice x src x mid x dst array.
+    for mid in range(index.tor_num):
+        first = index.send_after(slices, srcs[:, None], mid)
+        first[:, srcs == mid] = UNREACHED
+        second = index.send_after(first + 1, mid, tors)
+        second[..., mid] = UNREACHED
+        better = second < best
+        best[better] = second[better]
+        choice[better] = mid
+    return choice
+
+VLB_POLICIES = {
+    "earliest": vlb_earliest,
+    "round_robin": vlb_round_robin,
+    "hashed": vlb_hashed,
+    "least_wait": vlb_least_wait,
+}
+
+class ConnectivityIndex():
+    """
+    Time-expanded connectivity of an optical schedule.
+
+    conn[s, i, j] is True when ToR i and ToR j share a circuit in slice s.
+    next_direct[s, i, j] is the earliest slice at or after s (wrapping around
+    the schedule cycle) in which i and j are directly connected, -1 if never.
+    wait[s, i, j] is the number of slices from s to that circuit, or the largest
+    value of its dtype if never.
+    peers[s, i, k] is the k-th ToR that i shares a circuit with in slice s, in
+    increasing order, -1 past its last circuit.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.slice_num, self.tor_num, _ = conn.shape
+        self.next_direct = self._build_next_direct(conn)
+        self.wait = self._build_wait(self.next_direct)
+        self.peers = self._build_peers(conn)
+
+    def __getstate__(self):
+        # Ship only the packed schedule, the derived tables are rebuilt on load.
+        return {"shape": self.conn.shape, "bits": np.packbits(self.conn, axis=None)}
+
+    def __setstate__(self, state):
+        count = int(np.prod(state["shape"]))
+        self.__init__(np.unpackbits(state["bits"], count=count).astype(bool).reshape(state["shape"]))
+
+    @classmethod
+    def from_topo_slice(cls, topo_slice, tor_num, slice_num):
+        """Build the index from BaseNetwork.topo_slice (slice -> nx.Graph)."""
+        conn = np.zeros((slice_num, tor_num, tor_num), dtype=bool)
+        for time_slice in range(slice_num):
+            graph = topo_slice.get(time_slice)
+            if graph is None:
+                continue
+            edges = np.array([(u, v) for u, v in graph.edges() if u != v],
+                             dtype=np.int64).reshape(-1, 2)
+            conn[time_slice, edges[:, 0], edges[:, 1]] = True
+            conn[time_slice, edges[:, 1], edges[:, 0]] = True
+        return cls(conn)
+
+    @staticmethod
+    def slice_dtype(slice_num):
+        return np.int16 if slice_num < np.iinfo(np.int16).max else np.int32
+
+    @classmethod
+    def _build_next_direct(cls, conn):
+        slice_num = conn.shape[0]
+        dtype = cls.slice_dtype(slice_num)
+        next_direct = np.empty(conn.shape, dtype=dtype)
+        upcoming = np.full(conn.shape[1:], -1, dtype=dtype)
+        # Sweep the cycle backwards twice so the last slices see the wrap-around.
+        for step in reversed(range(2 * slice_num)):
+            time_slice = step % slice_num
+            np.copyto(upcoming, time_slice, where=conn[time_slice])
+            if step < slice_num:
+                next_direct[time_slice] = upcoming
+        return next_direct
+
+    @staticmethod
+    def _build_wait(next_direct):
+        slice_num = next_direct.shape[0]
+        slices = np.arange(slice_num, dtype=next_direct.dtype).reshape(-1, 1, 1)
+        wait = (next_direct - slices) % slice_num
+        wait[next_direct < 0] = np.iinfo(wait.dtype).max
+        return wait
+
+    @staticmethod
+    def _build_peers(conn):
+        degree = conn.sum(axis=2).ravel()
+        peers = np.full(conn.shape[:2] + (max(int(degree.max(initial=0)), 1),), -1, dtype=np.int32)
+        time_slice, tor, peer = np.nonzero(conn)
+        # nonzero is row-major, the peers of one (slice, tor) are a contiguous run.
+        rank = np.arange(len(peer)) - np.repeat(np.cumsum(degree) - degree, degree)
+        peers[time_slice, tor, rank] = peer
+        return peers
+
+    def earliest_direct_slice(self, src, dst, time_slice):
+        """Slice in which src can send directly to dst, -1 if never."""
+        if src >= self.tor_num or dst >= self.tor_num:
+            return -1
+        return int(self.next_direct[time_slice % self.slice_num, src, dst])
+
+    def send_after(self, start, src, dst):
+        """
+        Absolute slice of the first src -> dst circuit at or after absolute slice
+        start, UNREACHED if there is none. Arguments broadcast against each other.
+        """
+        wait = self.wait[start % self.slice_num, src, dst]
+        missing = (wait == np.iinfo(wait.dtype).max) | (start >= UNREACHED)
+        return np.where(missing, UNREACHED, start + wait).astype(np.int32)
+
+    def next_departure(self, avail):
+        """
+        Relax one hop of the time-expanded graph.
+        avail[t, v] is the earliest absolute slice a packet can leave v (UNREACHED if
+        it never gets there), nondecreasing down every column as it is over the arrival
+        slices of earliest_arrival. Returns the earliest absolute send slice into every
+        ToR w and the ToR v it is sent from, the lowest one on ties.
+
+        Only the circuits of the schedule are relaxed, in the order they occur: the
+        circuit v -> w in slice x serves the rows ready at v by x that no earlier
+        circuit into w served, which is a range of rows since avail is sorted.
+        """
+        rows, tor_num = avail.shape
+        depart = np.full(avail.shape, UNREACHED, dtype=np.int32)
+        pred = np.zeros(avail.shape, dtype=np.int32)
+        ready = avail < UNREACHED
+        if not ready.any():
+            return depart, pred
+        # Every row has seen a whole cycle of circuits a cycle after its last ready ToR.
+        times = np.arange(int(avail.min()), int(avail[ready].max()) + self.slice_num)
+        peer = self.peers[times % self.slice_num]
+        step, sender, uplink = np.nonzero(peer >= 0)
+        time, receiver = times[step], peer[step, sender, uplink]
+
+        # Rows ready at the sender by the circuit, found in the columns laid end to end.
+        stride = np.int64(UNREACHED) + 1
+        ready_at = (avail.T + np.arange(tor_num, dtype=np.int64)[:, None] * stride).ravel()
+        covered = np.searchsorted(ready_at, sender * stride + time, side="right") - sender * rows
+
+        # nonzero lists the circuits by time then sender, keep that order per receiver.
+        order = np.argsort(receiver, kind="stable")
+        time, sender, receiver, covered = time[order], sender[order], receiver[order], covered[order]
+        # Running maximum of the rows served into each receiver, shifted per receiver.
+        served = np.maximum.accumulate(receiver * (rows + 1) + covered) - receiver * (rows + 1)
+        first = np.r_[True, receiver[1:] != receiver[:-1]]
+        before = np.where(first, 0, np.r_[0, served[:-1]])
+        count = served - before
+        new = count > 0
+        time, sender, receiver, before, count = time[new], sender[new], receiver[new], before[new], count[new]
+        row = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count - before, count)
+        depart[row, np.repeat(receiver, count)] = np.repeat(time, count)
+        pred[row, np.repeat(receiver, count)] = np.repeat(sender, count)
+        return depart, pred
+
+    def earliest_arrival(self, src, hop_limit):
+        """
+        Earliest-arrival paths from src with at most hop_limit circuits, for every
+        arrival slice at src and every destination, in one pass over hop counts.
+        A packet that reaches an intermediate ToR in slice s leaves it in slice s + 1
+        at the earliest. Ties go to the path with fewer hops.
+
+        Returns (hop_num, send_slice, via): hop_num[t, dst] is the number of hops
+        (0 if dst is unreachable), send_slice[t, dst, k] and via[t, dst, k] are the
+        slice and the sending ToR of hop k, -1 past the last hop.
+        """
+        slice_num, tor_num = self.slice_num, self.tor_num
+        arrival = np.arange(slice_num)
+        avail = np.full((slice_num, tor_num), UNREACHED, dtype=np.int32)
+        avail[:, src] = arrival
+        best = np.full((slice_num, tor_num), UNREACHED, dtype=np.int32)
+        hop_num = np.zeros((slice_num, tor_num), dtype=np.int8)
+        depart_levels, pred_levels = [], []
+        for level in range(hop_limit):
+            depart, pred = self.next_departure(avail)
+            depart[:, src] = UNREACHED
+            improved = depart < best
+            best = np.where(improved, depart, best)
+            hop_num[improved] = level + 1
+            depart_levels.append(best)
+            pred_levels.append(pred)
+            if not improved.any():
+                break
+            avail = np.where(best < UNREACHED, best + 1, UNREACHED)
+            avail[:, src] = arrival
+
+        # Walk predecessors back from every destination, last hop first.
+        dtype = self.slice_dtype(slice_num)
+        send_slice = np.full((slice_num, tor_num, hop_limit), -1, dtype=dtype)
+        via = np.full((slice_num, tor_num, hop_limit), -1, dtype=np.int32)
+        rows = np.arange(slice_num)[:, None]
+        node = np.broadcast_to(np.arange(tor_num), (slice_num, tor_num)).copy()
+        for hop in reversed(range(len(depart_levels))):
+            active = hop_num > hop
+            sender = pred_levels[hop][rows, node]
+            send_slice[:, :, hop] = np.where(active, depart_levels[hop][rows, node] % slice_num, -1)
+            via[:, :, hop] = np.where(active, sender, -1)
+            node = np.where(active, sender, node)
+
+        return hop_num, send_slice, via
+
+    def direct_paths(self, src):
+        """Direct circuits from src in the layout of earliest_arrival."""
+        send_slice = self.next_direct[:, src, :, None].copy()
+        hop_num = (send_slice[..., 0] >= 0).astype(np.int8)
+        via = np.where(send_slice >= 0, src, -1).astype(np.int32)
+        return hop_num, send_slice, via
+
+    def slice_paths(self, src, hop_limit):
+        """
+        Shortest paths from src that stay inside the circuits of the arrival slice,
+        in the layout of earliest_arrival. Every hop is sent in the arrival slice,
+        which only reaches beyond the direct peers when ToRs have several uplinks.
+        """
+        slice_num, tor_num = self.slice_num, self.tor_num
+        hop_num = np.zeros((slice_num, tor_num), dtype=np.int8)
+        pred = np.full((slice_num, tor_num), -1, dtype=np.int32)
+        seen = np.zeros((slice_num, tor_num), dtype=bool)
+        seen[:, src] = True
+        frontier = seen.copy()
+        for level in range(hop_limit):
+            links = frontier[:, :, None] & self.conn
+            new = links.any(axis=1) & ~seen
+            if not new.any():
+                break
+            pred[new] = links.argmax(axis=1)[new]
+            hop_num[new] = level + 1
+            seen |= new
+            frontier = new
+
+        dtype = self.slice_dtype(slice_num)
+        send_slice = np.full((slice_num, tor_num, hop_limit), -1, dtype=dtype)
+        via = np.full((slice_num, tor_num, hop_limit), -1, dtype=np.int32)
+        rows = np.arange(slice_num)[:, None]
+        node = np.broadcast_to(np.arange(tor_num), (slice_num, tor_num)).copy()
+        for hop in reversed(range(hop_limit)):
+            active = hop_num > hop
+            sender = pred[rows, node]
+            send_slice[:, :, hop] = np.where(active, rows, -1)
+            via[:, :, hop] = np.where(active, sender, -1)
+            node = np.where(active, sender, node)
+        return hop_num, send_slice, via
+
+    def two_hop(self, start, src, mid, dst):
+        """Send slices of src -> mid -> dst leaving src at or after start, and whether it is usable."""
+        first = self.send_after(start, src, mid)
+        second = self.send_after(first + 1, mid, dst)
+        ok = (second < UNREACHED) & (mid != src) & (mid != dst)
+        return first, second, ok
+
+    def vlb_paths(self, policy="earliest"):
+        """
+        Two-hop Valiant load-balanced paths for every (slice, src, dst) at once.
+        policy is a name in VLB_POLICIES or a callable (index, srcs) -> via[t, src, dst]
+        choosing the intermediate ToR. A choice that cannot reach dst falls back to the
+        intermediate with the earliest second hop.
+
+        Returns (hop_num, send_slice, via) indexed by [t, src, dst] in the layout of
+        earliest_arrival.
+        """
+        choose = VLB_POLICIES[policy] if isinstance(policy, str) else policy
+
+        slice_num, tor_num = self.slice_num, self.tor_num
+        shape = (slice_num, tor_num, tor_num)
+        hop_num = np.zeros(shape, dtype=np.int8)
+        send_slice = np.full(shape + (2,), -1, dtype=self.slice_dtype(slice_num))
+        via = np.full(shape + (2,), -1, dtype=np.int32)
+        if tor_num < 3:
+            # No intermediate to bounce through, use the direct circuit.
+            hop_num[self.next_direct >= 0] = 1
+            send_slice[..., 0] = self.next_direct
+            via[..., 0] = np.where(self.next_direct >= 0, np.arange(tor_num)[:, None], -1)
+            return hop_num, send_slice, via
+
+        slices = np.arange(slice_num).reshape(-1, 1, 1)
+        dst = np.arange(tor_num)
+        chunk = max(1, (1 << 22) // (slice_num * tor_num))
+        for lo in range(0, tor_num, chunk):
+            srcs = np.arange(lo, min(lo + chunk, tor_num))
+            src = srcs[:, None]
+            mid = np.broadcast_to(choose(self, srcs), (slice_num, len(srcs), tor_num))
+            first, second, ok = self.two_hop(slices, src, mid, dst)
+            if not ok.all():
+                mid = np.where(ok, mid, vlb_least_wait(self, srcs))
+                first, second, ok = self.two_hop(slices, src, mid, dst)
+
+            ok &= src != dst
+            hop_num[:, lo:lo + len(srcs)] = np.where(ok, 2, 0)
+            send_slice[:, lo:lo + len(srcs), :, 0] = np.where(ok, first % slice_num, -1)
+            send_slice[:, lo:lo + len(srcs), :, 1] = np.where(ok, second % slice_num, -1)
+            via[:, lo:lo + len(srcs), :, 0] = np.where(ok, src, -1)
+            via[:, lo:lo + len(srcs), :, 1] = np.where(ok, mid, -1)
+
+        return hop_num, send_slice, via
+
+
+class PathEngine():
+    """
+    Memoized path tables shared by the routing functions of one BaseNetwork.
+
+    An entry holds (hop_num, send_slice, via) for one source over every arrival
+    slice and destination, so a (src, dst, slice) lookup is an array read once
+    the source has been solved. The least recently used sources are dropped
+    beyond max_sources entries. Batches solved for all sources at once (VLB)
+    are kept whole.
+    """
+
+    def __init__(self, index : ConnectivityIndex, max_sources=64):
+        self.index = index
+        self.max_sources = max_sources
+        self.cache = OrderedDict()
+        self.batches = {}
+        self.hits = 0
+        self.misses = 0
+
+    def solve(self, kind, src, param):
+        if kind == "direct":
+            return self.index.direct_paths(src)
+        if kind == "earliest":
+            return self.index.earliest_arrival(src, param)
+        if kind == "slice":
+            return self.index.slice_paths(src, param)
+        if kind == "vlb":
+            # VLB is solved for all sources in one batch, keep per-source views of it.
+            if param not in self.batches:
+                self.batches[param] = self.index.vlb_paths(param)
+            hop_num, send_slice, via = self.batches[param]
+            return hop_num[:, src], send_slice[:, src], via[:, src]
+        assert False, f"Unknown path kind {kind}"
+
+    def lookup(self, kind, src, param=None):
+        """
+        Per-source path table of the given kind:
+        "direct" | "earliest" (param = hop_limit) | "slice" (param = hop_limit) | "vlb" (param = policy)
+        """
+        key = (kind, src, param)
+        if key in self.cache:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        self.misses += 1
+        entry = self.solve(kind, src, param)
+        self.cache[key] = entry
+        while len(self.cache) > self.max_sources:
+            self.cache.popitem(last=False)
+        return entry
+
+    def hops(self, kind, src, dst, time_slice, param=None):
+        """(send slice, sending ToR) of every hop of the (src, dst, time_slice) path, None if dst is unreachable."""
+        hop_num, send_slice, via = self.lookup(kind, src, param)
+        time_slice %= self.index.slice_num
+        if dst >= self.index.tor_num or hop_num[time_slice, dst] == 0:
+            return None
+        num = hop_num[time_slice, dst]
+        return list(zip(send_slice[time_slice, dst, :num].tolist(), via[time_slice, dst, :num].tolist()))
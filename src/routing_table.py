@@ -0,0 +1,237 @@
+from collections.abc import MutableMapping
+from typing import List
+
+import numpy as np
+
+HOP_DTYPE = np.dtype([("valid_flag", np.uint8), ("send_slice", np.int16), ("send_port", np.int16)])
+
+class Hop:
+
+    __slots__ = ("valid_flag", "send_slice", "send_port")
+
+    def __init__(self, send_slice = -1, send_port = -1, valid_flag = 1):
+        self.valid_flag = valid_flag
+        self.send_slice = send_slice
+        self.send_port = send_port
+
+    def __str__(self):
+        return f"send slice: {self.send_slice}, send port: {self.send_port}"
+
+    def __repr__(self):
+        return f"{self.valid_flag} {self.send_slice} {self.send_port}"
+
+
+class Path:
+
+    __slots__ = ("src", "dst", "arrival_ts", "ssrr")
+
+    ssrr_len = 6
+
+    def __init__(self, src, dst, arrival_ts, ssrr : List[Hop]): ##ssrr is a list of HOP
+        self.src = src
+        self.dst = dst
+        self.arrival_ts = arrival_ts
+        self.ssrr = ssrr
+
+    def __str__(self):
+        return f"Path ({self.src}->{self.dst},{self.arrival_ts}): {str(self.ssrr)}"
+
+    def __repr__(self):
+        return f"Path ({self.src}->{self.dst},{self.arrival_ts}): {str(self.ssrr)}"
+
+    def ssrr_entry(self):
+        pended_ssrr = self.ssrr + [Hop(valid_flag=0) for _ in range(self.ssrr_len - len(self.ssrr))]
+        pended_ssrr[-1].valid_flag = 255 #end flag
+        return " ".join(repr(hop) for hop in pended_ssrr)
+
+
+def source_arrays(paths, tor_num, slice_num):
+    """RoutingTable.set_source arrays of one source from a {(dst, arrival_slice): Path} mapping."""
+    hop_limit = max([len(path.ssrr) for path in paths.values() if path is not None], default=1)
+    hop_num = np.full((tor_num, slice_num), -1, dtype=np.int8)
+    hops = np.zeros((tor_num, slice_num, hop_limit), dtype=HOP_DTYPE)
+    for (dst, time_slice), path in paths.items():
+        if path is None:
+            continue
+        hop_num[dst, time_slice] = len(path.ssrr)
+        for hop_idx, hop in enumerate(path.ssrr):
+            hops[dst, time_slice, hop_idx] = (hop.valid_flag, hop.send_slice, hop.send_port)
+    return hop_num, hops
+
+
+class RoutingTable():
+    """
+    Canonical routing store: hops[src, dst, arrival_slice, hop_idx] holds
+    (valid_flag, send_slice, send_port) and hop_num[src, dst, arrival_slice] the
+    number of hops, -1 when there is no path. The hop axis grows with the longest
+    path stored. Path and Hop objects are only built when a path is read.
+    """
+
+    def __init__(self, tor_num, slice_num, hop_limit=1):
+        self.tor_num = tor_num
+        self.slice_num = slice_num
+        self.hop_num = np.full((tor_num, tor_num, slice_num), -1, dtype=np.int8)
+        self.hops = np.zeros((tor_num, tor_num, slice_num, hop_limit), dtype=HOP_DTYPE)
+
+    @classmethod
+    def from_arrays(cls, hop_num, hops):
+        table = cls(hop_num.shape[0], hop_num.shape[2])
+        table.hop_num = hop_num
+        table.hops = hops
+        return table
+
+    def reserve(self, hop_limit):
+        """Widen the hop axis to hold paths of hop_limit hops."""
+        if hop_limit <= self.hops.shape[-1]:
+            return
+        hops = np.zeros(self.hops.shape[:-1] + (hop_limit,), dtype=HOP_DTYPE)
+        hops[..., :self.hops.shape[-1]] = self.hops
+        self.hops = hops
+
+    def set_path(self, src, dst, time_slice, path):
+        self.hops[src, dst, time_slice] = 0
+        if path is None:
+            self.hop_num[src, dst, time_slice] = -1
+            return
+        self.reserve(len(path.ssrr))
+        self.hop_num[src, dst, time_slice] = len(path.ssrr)
+        for hop_idx, hop in enumerate(path.ssrr):
+            self.hops[src, dst, time_slice, hop_idx] = (hop.valid_flag, hop.send_slice, hop.send_port)
+
+    def set_source(self, src, hop_num, hops):
+        """Store every path of src at once: hop_num[dst, t] and hops[dst, t, hop_idx]."""
+        self.reserve(hops.shape[-1])
+        self.hop_num[src] = hop_num
+        self.hops[src, :, :, :hops.shape[-1]] = hops
+        self.hops[src, :, :, hops.shape[-1]:] = 0
+
+    def source(self, src):
+        """hop_num and hops of src, as accepted by set_source."""
+        return self.hop_num[src], self.hops[src]
+
+    def path(self, src, dst, time_slice):
+        num = self.hop_num[src, dst, time_slice]
+        if num < 0:
+            return None
+        return Path(src, dst, time_slice,
+                    [Hop(int(hop["send_slice"]), int(hop["send_port"]), int(hop["valid_flag"]))
+                     for hop in self.hops[src, dst, time_slice, :num]])
+
+    def keys(self, src):
+        """(dst, arrival_slice) of src in routing order."""
+        return [(dst, time_slice) for dst in range(self.tor_num) if dst != src
+                for time_slice in range(self.slice_num)]
+
+    def ssrr_entries(self, src):
+        """
+        Render the SSRR action data of every path of src in bulk, in routing order.
+        Yields (dst, arrival_slice, ssrr) for the pairs that have a path.
+        """
+        keys = np.array(self.keys(src), dtype=np.int64).reshape(-1, 2)
+        keys = keys[self.hop_num[src, keys[:, 0], keys[:, 1]] >= 0]
+        for (dst, time_slice), ssrr in zip(keys.tolist(), self.render_ssrr(src, keys)):
+            yield dst, time_slice, ssrr
+
+    def render_ssrr(self, src, keys):
+        """SSRR action data of the routed (dst, arrival_slice) pairs in keys."""
+        hop_num = self.hop_num[src, keys[:, 0], keys[:, 1]]
+        hops = self.hops[src, keys[:, 0], keys[:, 1]]
+
+        # Pad every path to ssrr_len entries, the last entry carries the end flag.
+        padded = np.zeros((len(keys), Path.ssrr_len), dtype=HOP_DTYPE)
+        padded["send_slice"] = -1
+        padded["send_port"] = -1
+        width = min(hops.shape[-1], Path.ssrr_len)
+        in_path = np.arange(width) < hop_num[:, None]
+        padded[:, :width] = np.where(in_path, hops[:, :width], padded[:, :width])
+        padded["valid_flag"][:, -1] = 255
+
+        columns = np.stack([padded["valid_flag"], padded["send_slice"], padded["send_port"]], axis=-1)
+        columns = columns.reshape(len(keys), 3 * Path.ssrr_len).tolist()
+        line = " ".join(["%d"] * (3 * Path.ssrr_len))
+        return [line % tuple(values) for values in columns]
+
+    def route_rows(self, src):
+        """rows[dst, arrival_slice] as bytes that are equal exactly when two paths of src carry the same SSRR."""
+        hop_num = self.hop_num[src]
+        in_path = np.arange(self.hops.shape[-1]) < hop_num[..., None]
+        hops = np.where(in_path, self.hops[src], np.zeros((), dtype=HOP_DTYPE))
+        hops = np.ascontiguousarray(hops).view(np.uint8).reshape(self.tor_num, self.slice_num, -1)
+        return np.concatenate([hop_num.view(np.uint8)[..., None], hops], axis=-1)
+
+    def range_entries(self, src):
+        """
+        Fold the arrival slices of every dst into range entries of source_routing_table.
+        Runs of consecutive arrival slices with the same SSRR share one entry. The route
+        covering the most runs becomes a catch-all over every slice at priority 2 that the
+        other runs override at priority 1; when that route is "no path" it is left to the
+        table miss instead, otherwise slices without a path get an explicit drop.
+        Yields (dst, first_slice, last_slice, priority, ssrr), ssrr None for drop.
+        """
+        entries = self.range_runs(src)
+        keys = np.array([(dst, time_slice) for dst, _, _, _, time_slice, routed in entries if routed],
+                        dtype=np.int64).reshape(-1, 2)
+        ssrrs = iter(self.render_ssrr(src, keys))
+        for dst, first, last, priority, _, routed in entries:
+            yield dst, first, last, priority, next(ssrrs) if routed else None
+
+    def range_runs(self, src):
+        """
+        Range entries of src before their SSRR is rendered, see range_entries:
+        (dst, first_slice, last_slice, priority, a slice of the run, routed).
+        """
+        rows = self.route_rows(src)
+        change = np.ones((self.tor_num, self.slice_num), dtype=bool)
+        change[:, 1:] = (rows[:, 1:] != rows[:, :-1]).any(axis=-1)
+        run_dst, run_start = np.nonzero(change)
+        run_end = np.r_[run_start[1:], 0] - 1
+        run_end[np.r_[run_dst[1:] != run_dst[:-1], True]] = self.slice_num - 1
+        _, run_group = np.unique(rows[run_dst, run_start], axis=0, return_inverse=True)
+        run_group = run_group.reshape(-1)
+        run_routed = self.hop_num[src, run_dst, run_start] >= 0
+        bounds = np.searchsorted(run_dst, np.arange(self.tor_num + 1))
+
+        entries = []
+        for dst in range(self.tor_num):
+            if dst == src:
+                continue
+            lo, hi = bounds[dst], bounds[dst + 1]
+            groups, first_run, runs = np.unique(run_group[lo:hi], return_index=True, return_counts=True)
+            routed = run_routed[lo:hi][first_run]
+            default = np.argmin(hi - lo - runs + routed)
+            if routed[default]:
+                entries.append((dst, 0, self.slice_num - 1, 2, int(run_start[lo + first_run[default]]), True))
+            for run in range(lo, hi):
+                if run_group[run] != groups[default]:
+                    entries.append((dst, int(run_start[run]), int(run_end[run]), 1, int(run_start[run]), bool(run_routed[run])))
+        return entries
+
+
+class SourceRoutes(MutableMapping):
+    """Mapping (dst, arrival_slice) -> Path of one source, viewing a RoutingTable."""
+
+    def __init__(self, table : RoutingTable, src):
+        self.table = table
+        self.src = src
+
+    def __getitem__(self, key):
+        dst, time_slice = key
+        if dst == self.src or not (0 <= dst < self.table.tor_num and 0 <= time_slice < self.table.slice_num):
+            raise KeyError(key)
+        return self.table.path(self.src, dst, time_slice)
+
+    def __setitem__(self, key, path):
+        dst, time_slice = key
+        self.table.set_path(self.src, dst, time_slice, path)
+
+    def __delitem__(self, key):
+        self[key] = None
+
+    def __iter__(self):
+        return iter(self.table.keys(self.src))
+
+    def __len__(self):
+        return (self.table.tor_num - 1) * self.table.slice_num
+
+    def __repr__(self):
+        return repr(dict(self.items()))
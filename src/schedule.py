@@ -0,0 +1,400 @@
+import networkx as nx
+import numpy as np
+
+class Schedule():
+    """
+    Circuit schedule of the OCS.
+
+    peer[s, tor, uplink] is the ToR reached through uplink of tor in slice s,
+    -1 when that uplink is idle, and peer_uplink[s, tor, uplink] the uplink of
+    that peer the circuit lands on. Circuits are symmetric: when (a, x) reaches
+    (b, y), (b, y) reaches (a, x) in the same slice.
+
+    Every (tor, uplink) owns one OCS port, see ocs_port.
+    """
+
+    def __init__(self, peer=None, peer_uplink=None):
+        if peer is None:
+            peer = np.full((0, 0, 1), -1, dtype=np.int32)
+        if peer_uplink is None:
+            peer_uplink = np.where(peer >= 0, 0, -1).astype(np.int32)
+        self.peer = peer
+        self.peer_uplink = peer_uplink
+
+    @property
+    def slice_num(self):
+        return self.peer.shape[0]
+
+    @property
+    def tor_num(self):
+        return self.peer.shape[1]
+
+    @property
+    def uplink_num(self):
+        return self.peer.shape[2]
+
+    def peers(self, tor, time_slice):
+        """ToRs reached by tor in time_slice."""
+        peers = self.peer[time_slice % self.slice_num, tor]
+        return peers[peers >= 0].tolist()
+
+    def is_connected(self, tor1, tor2, time_slice):
+        return bool((self.peer[time_slice % self.slice_num, tor1] == tor2).any())
+
+    def uplink_to(self, time_slice, tor, peer):
+        """Uplink of tor holding a circuit to peer in time_slice, -1 if none. Arguments broadcast."""
+        time_slice, tor, peer = np.broadcast_arrays(time_slice, tor, peer)
+        links = self.peer[time_slice % max(self.slice_num, 1), tor] == peer[..., None]
+        return np.where(links.any(axis=-1), links.argmax(axis=-1), -1)
+
+    def ocs_port(self, tor, uplink):
+        """0-based OCS port of an uplink: uplink 0 of every ToR first, then uplink 1, ..."""
+        return uplink * self.tor_num + tor
+
+    def grow(self, slice_num, tor_num, uplink_num):
+        """Pad the schedule with idle uplinks up to the given sizes."""
+        shape = tuple(max(have, want) for have, want in zip(self.peer.shape, (slice_num, tor_num, uplink_num)))
+        if shape == self.peer.shape:
+            return
+        old = (slice(self.slice_num), slice(self.tor_num), slice(self.uplink_num))
+        peer = np.full(shape, -1, dtype=self.peer.dtype)
+        peer_uplink = np.full(shape, -1, dtype=self.peer_uplink.dtype)
+        peer[old] = self.peer
+        peer_uplink[old] = self.peer_uplink
+        self.peer = peer
+        self.peer_uplink = peer_uplink
+
+    def connect(self, tor1, tor2, time_slice, uplink1=None, uplink2=None):
+        """
+        Add a circuit between uplink1 of tor1 and uplink2 of tor2 in time_slice.
+        An uplink left as None is the first idle uplink of its ToR.
+        """
+        self.grow(time_slice + 1, max(tor1, tor2) + 1, 1 + max(uplink1 or 0, uplink2 or 0))
+        if uplink1 is None and uplink2 is None and self.is_connected(tor1, tor2, time_slice):
+            return
+        uplinks = []
+        for tor, uplink in ((tor1, uplink1), (tor2, uplink2)):
+            if uplink is None:
+                idle = np.flatnonzero(self.peer[time_slice, tor] < 0)
+                if len(idle) == 0:
+                    self.grow(self.slice_num, self.tor_num, self.uplink_num + 1)
+                    idle = [self.uplink_num - 1]
+                uplink = int(idle[0])
+            uplinks.append(uplink)
+        uplink1, uplink2 = uplinks
+        for tor, uplink, peer, peer_uplink in ((tor1, uplink1, tor2, uplink2), (tor2, uplink2, tor1, uplink1)):
+            busy = (self.peer[time_slice, tor, uplink], self.peer_uplink[time_slice, tor, uplink])
+            assert busy[0] < 0 or busy == (peer, peer_uplink), \
+                f"Uplink {uplink} of ToR {tor} already has a circuit in slice {time_slice}"
+        self.peer[time_slice, tor1, uplink1] = tor2
+        self.peer_uplink[time_slice, tor1, uplink1] = uplink2
+        self.peer[time_slice, tor2, uplink2] = tor1
+        self.peer_uplink[time_slice, tor2, uplink2] = uplink1
+
+    def circuits(self, time_slice):
+        """(tor1, tor2) with tor1 < tor2 of every circuit in time_slice, ordered by tor1 and uplink."""
+        peer = self.peer[time_slice]
+        tor, uplink = np.nonzero(peer > np.arange(self.tor_num)[:, None])
+        return list(zip(tor.tolist(), peer[tor, uplink].tolist()))
+
+    def ocs_circuits(self, time_slice):
+        """(port1, port2) with port1 < port2 of every circuit in time_slice, as 0-based OCS ports."""
+        port = self.ocs_port(np.arange(self.tor_num)[:, None], np.arange(self.uplink_num))
+        peer_port = self.ocs_port(self.peer[time_slice], self.peer_uplink[time_slice])
+        ports = np.nonzero((self.peer[time_slice] >= 0) & (peer_port > port))
+        return list(zip(port[ports].tolist(), peer_port[ports].tolist()))
+
+    def conn(self):
+        """conn[s, i, j], True when i and j share a circuit in slice s."""
+        conn = np.zeros((self.slice_num, self.tor_num, self.tor_num), dtype=bool)
+        slices, tors, uplinks = np.nonzero(self.peer >= 0)
+        conn[slices, tors, self.peer[slices, tors, uplinks]] = True
+        return conn
+
+    def to_dict(self):
+        """Per-slice OCS port pairs in the format of BaseNetwork.topo_to_dict, consumed by gen_ocs_commands."""
+        return dict({"s1": {"slices": [self.ocs_circuits(time_slice) for time_slice in range(self.slice_num)]}})
+
+    def slice_graph(self, time_slice) -> nx.Graph:
+        graph = nx.Graph()
+        graph.add_nodes_from(range(self.tor_num))
+        graph.add_edges_from(self.circuits(time_slice))
+        return graph
+
+    def graph(self) -> nx.Graph:
+        """All circuits of the cycle; each edge keeps the last slice it appears in as ts."""
+        graph = nx.Graph()
+        graph.add_nodes_from(range(self.tor_num))
+        for time_slice in range(self.slice_num):
+            graph.add_edges_from(self.circuits(time_slice), ts=time_slice)
+        return graph
+
+    def validate(self):
+        """
+        Problems that make the schedule unusable, as messages (empty when valid):
+        peers out of range, self-loops and circuits that the peer does not hold
+        back on the announced uplink.
+        """
+        problems = []
+        slices, tors, uplinks = np.nonzero(self.peer >= 0)
+        peer = self.peer[slices, tors, uplinks]
+        peer_uplink = self.peer_uplink[slices, tors, uplinks]
+        checks = [("peer out of range", (peer >= self.tor_num) | (peer_uplink < 0) | (peer_uplink >= self.uplink_num))]
+        peer = np.minimum(peer, self.tor_num - 1)
+        peer_uplink = np.clip(peer_uplink, 0, self.uplink_num - 1)
+        checks.append(("self-loop", peer == tors))
+        checks.append(("one-way circuit", (self.peer[slices, peer, peer_uplink] != tors)
+                       | (self.peer_uplink[slices, peer, peer_uplink] != uplinks)))
+        for name, bad in checks:
+            bad = np.flatnonzero(bad)
+            if len(bad) == 0:
+                continue
+            examples = ", ".join(f"slice {slices[i]} tor {tors[i]} uplink {uplinks[i]}" for i in bad[:3])
+            problems.append(f"{len(bad)} uplinks with a {name}: {examples}{', ...' if len(bad) > 3 else ''}")
+        return problems
+
+    def analyze(self):
+        """
+        Latency and coverage of the schedule, without materializing per-slice tensors.
+        For an ordered pair whose direct circuits sit in gaps g_1..g_m around the cycle,
+        a packet arriving in a uniformly random slice waits g - 1 slices at worst and
+        sum(g * (g - 1) / 2) / slice_num on average.
+
+        Returns a dict with
+        max_wait[src, dst] / mean_wait[src, dst]: waits for the direct circuit, -1 when never,
+        matching_size[s]: circuits in slice s,
+        unreachable: (src, dst) with src < dst that never share a circuit.
+        """
+        slice_num, tor_num = self.slice_num, self.tor_num
+        slices, tors, uplinks = np.nonzero((self.peer >= 0) & (self.peer != np.arange(tor_num)[:, None]))
+        matching_size = np.bincount(slices, minlength=slice_num) // 2
+
+        pair = tors.astype(np.int64) * tor_num + self.peer[slices, tors, uplinks]
+        key = np.sort(pair * slice_num + slices)
+        key = key[np.r_[True, key[1:] != key[:-1]]]
+        pair, slices = key // slice_num, key % slice_num
+        first = np.r_[True, pair[1:] != pair[:-1]]
+        starts = np.flatnonzero(first)
+        # Gap to the next circuit of the same pair, wrapping to the first one of the next cycle.
+        next_slice = np.r_[slices[1:], 0]
+        last = np.r_[starts[1:], len(pair)] - 1
+        next_slice[last] = slices[starts] + slice_num
+        gap = next_slice - slices
+
+        max_wait = np.full(tor_num * tor_num, -1, dtype=np.int32)
+        mean_wait = np.full(tor_num * tor_num, -1.0)
+        if len(starts):
+            max_wait[pair[starts]] = np.maximum.reduceat(gap, starts) - 1
+            mean_wait[pair[starts]] = np.add.reduceat(gap * (gap - 1) // 2, starts) / slice_num
+        max_wait = max_wait.reshape(tor_num, tor_num)
+        mean_wait = mean_wait.reshape(tor_num, tor_num)
+
+        src, dst = np.nonzero(np.triu(max_wait < 0, k=1))
+        return {
+            "max_wait": max_wait,
+            "mean_wait": mean_wait,
+            "matching_size": matching_size,
+            "unreachable": np.stack([src, dst], axis=1),
+        }
+
+    @classmethod
+    def round_robin(cls, tor_num, port_num=1):
+        """
+        Circle-method round robin inside groups of tor_num // port_num ToRs. ToR i
+        of group p meets ToR j of every group q with uplink q (landing on uplink p of j),
+        and in the extra last slice the ToRs at the same position of the other groups.
+        """
+        group_num = tor_num // port_num
+        slice_num = group_num if port_num > 1 else group_num - 1
+        tors = np.arange(tor_num)
+        group, position = tors // group_num, tors % group_num
+        peer = np.full((slice_num, tor_num, port_num), -1, dtype=np.int32)
+
+        # Slice s pairs the positions of the circle rotated s times.
+        slices = np.arange(group_num - 1)[:, None]
+        circle = np.arange(group_num)
+        circle = np.where(circle == 0, 0, 1 + (circle - 1 - slices) % max(group_num - 1, 1))
+        partner = np.empty_like(circle)
+        partner[np.arange(group_num - 1)[:, None], circle] = circle[:, ::-1]
+        peer[:group_num - 1] = (partner[:, position][:, :, None]
+                                + np.arange(port_num) * group_num).astype(np.int32)
+
+        if port_num > 1:
+            last = position[:, None] + np.arange(port_num) * group_num
+            peer[-1] = np.where(np.arange(port_num) == group[:, None], -1, last)
+        peer_uplink = np.where(peer >= 0, group[:, None], -1).astype(np.int32)
+        return cls(peer, peer_uplink)
+
+    @classmethod
+    def latency_optimal(cls, tor_num, uplink_num=1):
+        """
+        Shortest cycle in which every pair of tor_num ToRs shares a circuit, for any
+        ToR and uplink count. Every ToR needs tor_num - 1 peers at uplink_num per slice,
+        so no schedule covers all pairs in fewer than ceil((tor_num - 1) / uplink_num)
+        slices, nor with fewer slices than circuits allow when both counts are odd.
+
+        Even tor_num: the rounds of the circle method, uplink_num perfect matchings
+        per slice, which reaches the bound. Odd tor_num with even uplink_num: Walecki's
+        decomposition of the complete graph into Hamiltonian cycles, uplink_num / 2
+        cycles per slice, which reaches the bound. Odd tor_num and odd uplink_num: the
+        circle method with an idle dummy ToR, at most one slice above the bound.
+
+        Uplinks left idle in the last slice repeat the rounds of the middle slice,
+        which halves the worst-case wait of those pairs.
+        """
+        if tor_num % 2 == 1 and uplink_num % 2 == 0:
+            rounds, rounds_uplink = cls._walecki_cycles(tor_num)
+        else:
+            rounds, rounds_uplink = cls._circle_rounds(tor_num)
+        per_slice = uplink_num // rounds.shape[-1]
+        slice_num = -(-len(rounds) // per_slice)
+        spare = slice_num * per_slice - len(rounds)
+        middle = (slice_num - 1) // 2 * per_slice
+        order = np.r_[np.arange(len(rounds)), (middle + np.arange(spare)) % len(rounds)]
+
+        # Round r of a slice occupies uplinks r * width .. (r + 1) * width - 1.
+        width = rounds.shape[-1]
+        peer = rounds[order].reshape(slice_num, per_slice, tor_num, width)
+        peer_uplink = rounds_uplink[order].reshape(slice_num, per_slice, tor_num, width)
+        peer_uplink = np.where(peer >= 0, peer_uplink + width * np.arange(per_slice)[:, None, None], -1)
+        peer = peer.transpose(0, 2, 1, 3).reshape(slice_num, tor_num, per_slice * width)
+        peer_uplink = peer_uplink.transpose(0, 2, 1, 3).reshape(slice_num, tor_num, per_slice * width)
+        schedule = cls(peer.astype(np.int32), peer_uplink.astype(np.int32))
+        schedule.grow(slice_num, tor_num, uplink_num)
+        return schedule
+
+    @classmethod
+    def from_demand(cls, demand, slice_num, uplink_num=1):
+        """
+        Decompose a traffic matrix (demand[src, dst]) into slice_num slices of
+        uplink_num matchings each, giving hot pairs circuits in proportion to their
+        demand. Circuits are bidirectional, so a pair is served for both directions.
+
+        Every pair with demand gets a circuit first: when the matchings allow it, the
+        rounds of the circle method that hold such pairs are spread over the cycle as a
+        base, otherwise the greedy matchings prefer the pairs still without a circuit.
+        Every circuit slot serves an equal share of the total demand. The other
+        matchings are built greedily on the demand still unserved; ToRs left without a
+        circuit are then paired with the peers they have not met for the longest, so
+        spare uplinks still shorten the waits of idle pairs.
+        """
+        demand = np.asarray(demand, dtype=np.float64)
+        tor_num = demand.shape[0]
+        assert demand.shape == (tor_num, tor_num), "The traffic matrix must be tor_num x tor_num"
+        residual = demand + demand.T
+        np.fill_diagonal(residual, 0)
+        demanded = residual > 0
+        slots = slice_num * uplink_num * (tor_num // 2)
+        share = residual.sum() / 2 / max(slots, 1)
+
+        # Base matchings: the circle rounds holding demanded pairs, evenly spaced.
+        matching_num = slice_num * uplink_num
+        rounds = cls._circle_rounds(tor_num)[0][:, :, 0]
+        rounds = rounds[(demanded & (rounds[:, :, None] == np.arange(tor_num))).any(axis=(1, 2))]
+        base = {}
+        if len(rounds) <= matching_num:
+            base = {index * matching_num // len(rounds): rounds[index] for index in range(len(rounds))}
+
+        tors = np.arange(tor_num)
+        # Unique per unordered pair, breaks ties between equal weights consistently.
+        tie = (np.minimum(tors[:, None], tors) * tor_num + np.maximum(tors[:, None], tors)) / (tor_num * tor_num)
+        last_met = np.full((tor_num, tor_num), -slice_num, dtype=np.int64)
+        met = np.zeros((tor_num, tor_num), dtype=bool)
+        peer = np.full((slice_num, tor_num, uplink_num), -1, dtype=np.int32)
+        for time_slice in range(slice_num):
+            for uplink in range(uplink_num):
+                if time_slice * uplink_num + uplink in base:
+                    partner = base[time_slice * uplink_num + uplink].astype(np.int32)
+                else:
+                    # Pairs still without a circuit outweigh any demand.
+                    weight = residual + np.where(demanded & ~met, residual.sum() + 1, 0)
+                    partner = greedy_matching(weight, residual > 0, tie)
+                served = partner >= 0
+                stale = (time_slice - last_met).astype(np.float64)
+                idle = ~served
+                filler = greedy_matching(stale, idle[:, None] & idle, tie)
+                partner = np.where(served, partner, filler)
+
+                matched = np.flatnonzero(partner >= 0)
+                residual[matched, partner[matched]] = np.maximum(residual[matched, partner[matched]] - share, 0)
+                last_met[matched, partner[matched]] = time_slice
+                met[matched, partner[matched]] = True
+                peer[time_slice, :, uplink] = partner
+        peer_uplink = np.where(peer >= 0, np.arange(uplink_num), -1).astype(np.int32)
+
+        unserved = np.argwhere(np.triu(demanded & ~met))
+        if len(unserved):
+            print(f"Warning: {len(unserved)} ToR pairs with demand get no circuit in {slice_num} slices "
+                  f"of {uplink_num} uplinks: " + ", ".join(f"{src}-{dst}" for src, dst in unserved[:8].tolist()))
+        return cls(peer, peer_uplink)
+
+    @staticmethod
+    def _circle_rounds(tor_num):
+        """
+        1-factorization of the complete graph, peer[round, tor, 0] (-1 idle). An odd
+        tor_num is padded with a dummy ToR whose partner idles in that round.
+        """
+        even = tor_num + tor_num % 2
+        rounds = np.arange(even - 1)[:, None]
+        offset = np.arange(1, even // 2)
+        peer = np.empty((even - 1, even), dtype=np.int64)
+        peer[rounds[:, 0], even - 1] = rounds[:, 0]
+        peer[rounds[:, 0], rounds[:, 0]] = even - 1
+        peer[rounds, (rounds + offset) % (even - 1)] = (rounds - offset) % (even - 1)
+        peer[rounds, (rounds - offset) % (even - 1)] = (rounds + offset) % (even - 1)
+        peer = np.where(peer >= tor_num, -1, peer)[:, :tor_num, None]
+        return peer, np.where(peer >= 0, 0, -1)
+
+    @staticmethod
+    def _walecki_cycles(tor_num):
+        """
+        Walecki's Hamiltonian decomposition of the complete graph on an odd tor_num:
+        peer[cycle, tor, 0] is the next ToR around the cycle and peer[cycle, tor, 1]
+        the previous one, which lands on uplink 1 and 0 of that peer respectively.
+        """
+        ring = tor_num - 1
+        step = np.arange(ring)
+        offset = np.where(step % 2 == 1, (step + 1) // 2, -(step // 2))
+        # Cycle i: hub, i, i + 1, i - 1, i + 2, ..., i + ring / 2, back to the hub.
+        order = np.c_[np.full(ring // 2, ring), (np.arange(ring // 2)[:, None] + offset) % ring]
+        peer = np.empty((ring // 2, tor_num, 2), dtype=np.int64)
+        cycles = np.arange(ring // 2)[:, None]
+        peer[cycles, order, 0] = np.roll(order, -1, axis=1)
+        peer[cycles, order, 1] = np.roll(order, 1, axis=1)
+        peer_uplink = np.broadcast_to([1, 0], peer.shape)
+        return peer, peer_uplink
+
+    @classmethod
+    def random(cls, tor_num, slice_num, rng : np.random.Generator):
+        """A uniformly random maximum matching per slice; with an odd tor_num one random ToR idles."""
+        order = rng.permuted(np.tile(np.arange(tor_num, dtype=np.int32), (slice_num, 1)), axis=1)
+        pairs = order[:, :tor_num - tor_num % 2].reshape(slice_num, -1, 2)
+        peer = np.full((slice_num, tor_num, 1), -1, dtype=np.int32)
+        slices = np.arange(slice_num)[:, None]
+        peer[slices, pairs[:, :, 0], 0] = pairs[:, :, 1]
+        peer[slices, pairs[:, :, 1], 0] = pairs[:, :, 0]
+        return cls(peer)
+
+
+def greedy_matching(weight, allowed, tie):
+    """
+    Greedy maximum-weight matching over the allowed pairs of a symmetric weight
+    matrix, partner[tor] (-1 unmatched). Every round matches the pairs that are
+    each other's heaviest remaining choice, which always includes the heaviest
+    remaining pair, so the result is the one of the sequential greedy algorithm.
+    """
+    tor_num = weight.shape[0]
+    scale = np.abs(weight).max() + 1 if weight.size else 1
+    weight = np.where(allowed, weight + tie * 1e-9 * scale, -np.inf)
+    np.fill_diagonal(weight, -np.inf)
+    partner = np.full(tor_num, -1, dtype=np.int32)
+    tors = np.arange(tor_num)
+    while True:
+        best = weight.argmax(axis=1)
+        mutual = (weight[tors, best] > -np.inf) & (best[best] == tors)
+        if not mutual.any():
+            return partner
+        matched = tors[mutual]
+        partner[matched] = best[matched]
+        weight[matched, :] = -np.inf
+        weight[:, matched] = -np.inf
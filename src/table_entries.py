@@ -0,0 +1,187 @@
+import json
+from collections.abc import Mapping
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+
+class TableEntry():
+    """
+    One entry of a P4 table, or its default action when match is None. Match fields,
+    action parameters and the priority are kept in runtime_CLI syntax, e.g. a range
+    is "lo->hi". Entries are produced by generators and consumed by the backends
+    below and by ThriftTableLoader, so no backend needs the whole table in memory.
+    """
+
+    __slots__ = ("table", "action", "match", "params", "priority")
+
+    def __init__(self, table : str, action : str, match : Optional[Tuple[str, ...]] = None,
+                 params : Tuple[str, ...] = (), priority : Optional[int] = None):
+        self.table = table
+        self.action = action
+        self.match = match
+        self.params = params
+        self.priority = priority
+
+    def is_default(self):
+        return self.match is None
+
+    def key(self):
+        """Identity of the entry in its table: match key and priority, the table alone for a default action."""
+        if self.is_default():
+            return (self.table,)
+        return (self.table, self.match, self.priority)
+
+    def value(self):
+        return (self.action, self.params)
+
+    def cli(self):
+        if self.is_default():
+            return " ".join(("table_set_default", self.table, self.action) + self.params)
+        priority = () if self.priority is None else (str(self.priority),)
+        return " ".join(("table_add", self.table, self.action) + self.match + ("=>",) + self.params + priority)
+
+    @classmethod
+    def parse(cls, line : str, has_priority : Callable[[str], bool]):
+        """Entry of a runtime_CLI command, None for a blank line. has_priority(table) tells whether its entries end with a priority."""
+        args = line.split()
+        if len(args) == 0:
+            return None
+        command, table, action = args[:3]
+        if command == "table_set_default":
+            return cls(table, action, params=tuple(args[3:]))
+
+        assert command == "table_add", f"Unsupported table command {command}"
+        split = args.index("=>")
+        params = args[split + 1:]
+        priority = int(params.pop(-1)) if has_priority(table) else None
+        return cls(table, action, tuple(args[3:split]), tuple(params), priority)
+
+    def __repr__(self):
+        return f"TableEntry({self.cli()})"
+
+
+def ocs_entries(slices) -> Iterator[TableEntry]:
+    """ocs_schedule entries of per-slice OCS port pairs, see BaseNetwork.topo_to_dict."""
+    yield TableEntry("ocs_schedule", "drop")
+    for slice_id, port_pairs in enumerate(slices):
+        for ingress_port, egress_port in port_pairs:
+            #ports starts from 1
+            ingress_port, egress_port = str(ingress_port + 1), str(egress_port + 1)
+            yield TableEntry("ocs_schedule", "ocs_forward", (ingress_port, str(slice_id)), (egress_port,))
+            yield TableEntry("ocs_schedule", "ocs_forward", (egress_port, str(slice_id)), (ingress_port,))
+
+
+def ip_to_dst_entries(ip_to_tor) -> Iterator[TableEntry]:
+    for ip, tor_id in ip_to_tor.items():
+        yield TableEntry("ip_to_dst_tor", "write_dst", (ip,), (str(tor_id),))
+
+
+def source_routing_entries(routing_table, src) -> Iterator[TableEntry]:
+    """
+    source_routing_table entries of src, see RoutingTable.range_entries.
+    bmv2 prefers the entry with the lower priority value.
+    """
+    for dst, first, last, priority, ssrr in routing_table.range_entries(src):
+        match = (str(dst), f"{first}->{last}")
+        if ssrr is None:
+            yield TableEntry("source_routing_table", "drop", match, priority=priority)
+        else:
+            yield TableEntry("source_routing_table", "write_ssrr_header", match, tuple(ssrr.split()), priority)
+
+
+#Backends
+
+def cli_text(entries : Iterable[TableEntry]):
+    """runtime_CLI commands of entries, one per line."""
+    return "".join(entry.cli() + "\n" for entry in entries)
+
+
+class LazyCommands(Mapping):
+    """Mapping key -> runtime_CLI commands of the given keys, rendered by render(key) on first access."""
+
+    def __init__(self, render : Callable[[int], str], keys : Iterable):
+        self.render = render
+        self.members = dict.fromkeys(keys)
+        self.rendered = {}
+
+    def __getitem__(self, key):
+        if key not in self.rendered:
+            if key not in self.members:
+                raise KeyError(key)
+            self.rendered[key] = self.render(key)
+        return self.rendered[key]
+
+    def __iter__(self):
+        return iter(self.members)
+
+    def __len__(self):
+        return len(self.members)
+
+
+def write_cli(entries : Iterable[TableEntry], file):
+    """Stream runtime_CLI commands of entries to an open text file, returns the number written."""
+    count = 0
+    for entry in entries:
+        file.write(entry.cli() + "\n")
+        count += 1
+    return count
+
+
+class ProgramNames():
+    """Fully qualified table and action names, match fields and action parameters of a compiled P4 program."""
+
+    def __init__(self, program_json):
+        with open(program_json) as file:
+            program = json.load(file)
+        # runtime_CLI accepts names without their control prefix, so do we.
+        self.actions = {}
+        for action in program["actions"]:
+            params = [data["name"] for data in action["runtime_data"]]
+            self.actions[action["name"]] = self.actions[action["name"].split(".")[-1]] = (action["name"], params)
+        self.tables = {}
+        for pipeline in program["pipelines"]:
+            for table in pipeline["tables"]:
+                fields = [key.get("name") or ".".join(key["target"]) for key in table["key"]]
+                self.tables[table["name"]] = self.tables[table["name"].split(".")[-1]] = (table["name"], fields)
+
+
+def json_value(token):
+    if "->" in token:
+        return [json_value(bound) for bound in token.split("->")]
+    try:
+        return int(token, 0)
+    except ValueError:
+        return token
+
+
+def json_entry(entry : TableEntry, names : Optional[ProgramNames] = None):
+    """
+    JSON object of an entry: table_name, action, key and data. Match fields and action
+    parameters are named after the program when names are given, positional otherwise.
+    """
+    table, fields = names.tables[entry.table] if names else (entry.table, [])
+    action, params = names.actions[entry.action] if names else (entry.action, [])
+    item = {
+        "table_name" : table,
+        "action" : action,
+        "data" : {params[i] if i < len(params) else str(i): json_value(param)
+                  for i, param in enumerate(entry.params)},
+    }
+    if entry.is_default():
+        item["default_action"] = True
+    else:
+        item["key"] = {fields[i] if i < len(fields) else str(i): json_value(field)
+                       for i, field in enumerate(entry.match)}
+        if entry.priority is not None:
+            item["priority"] = entry.priority
+    return item
+
+
+def write_json(entries : Iterable[TableEntry], file, names : Optional[ProgramNames] = None):
+    """Stream entries to an open text file as a JSON array, returns the number written."""
+    count = 0
+    file.write("[")
+    for entry in entries:
+        file.write(",\n  " if count else "\n  ")
+        file.write(json.dumps(json_entry(entry, names)))
+        count += 1
+    file.write("\n]\n" if count else "]\n")
+    return count
@@ -0,0 +1,166 @@
+import itertools
+import sys
+import time
+
+sys.path.insert(1, '../behavioral-model/tools')
+import runtime_CLI
+
+from table_entries import TableEntry
+
+class ThriftTableLoader():
+    """
+    Populate the tables of BMv2 switches running one P4 program over Thrift, from the
+    process that runs the emulation.
+
+    Entries are TableEntry or commands in the runtime_CLI syntax (table_add /
+    table_set_default). They are parsed once against the program's JSON and pushed in
+    pipelined batches: the requests of a
+    batch are all sent before the first reply is read, so a batch costs one round trip
+    instead of one per entry. Clients stay connected per Thrift port.
+
+    The loader remembers the entries it installed on every switch with their handles,
+    so diff() can turn a new set of commands into the adds, modifies and deletes that
+    move a running switch to it.
+    """
+
+    batch_size = 512
+
+    # runtime_CLI keeps the tables and actions of the last loaded program in module state.
+    loaded_json = None
+
+    def __init__(self, json_path, thrift_ip="localhost"):
+        self.json_path = json_path
+        self.thrift_ip = thrift_ip
+        self.clients = {}
+        # thrift_port -> {entry key: ((action, params), entry handle)}
+        self.installed = {}
+
+    def client(self, thrift_port):
+        if thrift_port not in self.clients:
+            services = runtime_CLI.RuntimeAPI.get_thrift_services(runtime_CLI.PreType.SimplePreLAG)
+            self.clients[thrift_port] = runtime_CLI.thrift_connect(self.thrift_ip, thrift_port, services)[0]
+        return self.clients[thrift_port]
+
+    def use_program(self):
+        if ThriftTableLoader.loaded_json != self.json_path:
+            runtime_CLI.load_json_config(None, self.json_path)
+            ThriftTableLoader.loaded_json = self.json_path
+
+    def has_priority(self, table_name):
+        table = runtime_CLI.get_res("table", table_name, runtime_CLI.ResType.table)
+        return table.match_type in {runtime_CLI.MatchType.TERNARY, runtime_CLI.MatchType.RANGE}
+
+    def parse(self, commands):
+        """TableEntry of CLI commands, entries are passed through."""
+        if not isinstance(commands, str):
+            yield from commands
+            return
+        self.use_program()
+        for line in commands.splitlines():
+            entry = TableEntry.parse(line, self.has_priority)
+            if entry is not None:
+                yield entry
+
+    def entries(self, commands):
+        """{TableEntry.key: TableEntry.value} of entries or CLI commands."""
+        return {entry.key(): entry.value() for entry in self.parse(commands)}
+
+    def request(self, kind, key, value, handle=None):
+        """
+        Thrift request (kind, key, value, args) for an entry. kind is "add", "modify"
+        or "delete" for the entry with the given handle, or "default".
+        """
+        table = runtime_CLI.get_res("table", key[0], runtime_CLI.ResType.table)
+        if kind == "delete":
+            return kind, key, value, (0, table.name, handle)
+        action = table.get_action(value[0])
+        runtime_data = runtime_CLI.parse_runtime_data(action, list(value[1]))
+        if kind == "default":
+            return kind, key, value, (0, table.name, action.name, runtime_data)
+        if kind == "modify":
+            return kind, key, value, (0, table.name, handle, action.name, runtime_data)
+        options = runtime_CLI.BmAddEntryOptions(priority=key[2] or 0)
+        match_key = runtime_CLI.parse_match_key(table, list(key[1]))
+        return kind, key, value, (0, table.name, match_key, action.name, runtime_data, options)
+
+    def requests(self, commands):
+        """Thrift requests of entries or CLI commands, generated one entry at a time."""
+        self.use_program()
+        for entry in self.parse(commands):
+            yield self.request("default" if entry.is_default() else "add", entry.key(), entry.value())
+
+    def prepare(self, commands):
+        """Parse entries or CLI commands into Thrift requests, see request."""
+        return list(self.requests(commands))
+
+    def diff(self, thrift_port, commands):
+        """
+        Requests that move the entries installed on a switch to commands: adds and
+        modifies first, so that an entry is never missing while it changes, then deletes.
+        """
+        self.use_program()
+        installed = self.installed.get(thrift_port, {})
+        entries = self.entries(commands)
+        requests = []
+        for key, value in entries.items():
+            if len(key) == 1:
+                if key not in installed or installed[key][0] != value:
+                    requests.append(self.request("default", key, value))
+            elif key not in installed:
+                requests.append(self.request("add", key, value))
+            elif installed[key][0] != value:
+                requests.append(self.request("modify", key, value, installed[key][1]))
+        for key, (value, handle) in installed.items():
+            if key not in entries and len(key) > 1:
+                requests.append(self.request("delete", key, value, handle))
+        return requests
+
+    def push(self, thrift_port, requests):
+        """Send requests, a list or a generator, returns the number sent and the number that failed."""
+        client = self.client(thrift_port)
+        installed = self.installed.setdefault(thrift_port, {})
+        send = {"add": client.send_bm_mt_add_entry,
+                "modify": client.send_bm_mt_modify_entry,
+                "delete": client.send_bm_mt_delete_entry,
+                "default": client.send_bm_mt_set_default_action}
+        recv = {"add": client.recv_bm_mt_add_entry,
+                "modify": client.recv_bm_mt_modify_entry,
+                "delete": client.recv_bm_mt_delete_entry,
+                "default": client.recv_bm_mt_set_default_action}
+        sent = 0
+        failed = 0
+        requests = iter(requests)
+        while True:
+            batch = list(itertools.islice(requests, self.batch_size))
+            if len(batch) == 0:
+                break
+            sent += len(batch)
+            for kind, _, _, args in batch:
+                send[kind](*args)
+            for kind, key, value, args in batch:
+                try:
+                    handle = recv[kind]()
+                except runtime_CLI.InvalidTableOperation as e:
+                    if failed == 0:
+                        print(f"Table operation failed on port {thrift_port}: "
+                              f"{runtime_CLI.TableOperationErrorCode._VALUES_TO_NAMES[e.code]}")
+                    failed += 1
+                    continue
+                if kind == "delete":
+                    del installed[key]
+                elif kind == "modify":
+                    installed[key] = (value, installed[key][1])
+                else:
+                    installed[key] = (value, handle)
+        return sent, failed
+
+    def load(self, name, thrift_port, commands=None, requests=None):
+        """Push entries or CLI commands (or prepared requests) to one switch, and report the rate."""
+        start = time.time()
+        if requests is None:
+            requests = self.requests(commands)
+        sent, failed = self.push(thrift_port, requests)
+        elapsed = max(time.time() - start, 1e-6)
+        print(f"Populated {name}: {sent - failed} entries in {elapsed:.3f}s "
+              f"({sent / elapsed:.0f} entries/s)" + (f", {failed} failed" if failed else ""))
+        return sent - failed
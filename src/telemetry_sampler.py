@@ -0,0 +1,108 @@
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from OpticalCLI import client_pool
+
+class Sample():
+    """
+    Telemetry of one switch at one sampler step. timestamp is the wall clock time
+    halfway through the RPC, latency its round trip in seconds; time_us and time_slice
+    are the switch's own clock and slice when it took the snapshot.
+    """
+
+    __slots__ = ("switch", "step", "timestamp", "latency", "time_us", "time_slice", "telemetry")
+
+    def __init__(self, switch, step, timestamp, latency, telemetry):
+        self.switch = switch
+        self.step = step
+        self.timestamp = timestamp
+        self.latency = latency
+        self.time_us = telemetry.time_us
+        self.time_slice = telemetry.time_slice
+        self.telemetry = telemetry
+
+    def __repr__(self):
+        return f"Sample({self.switch} step {self.step} at {self.timestamp:.6f}, slice {self.time_slice})"
+
+
+class TelemetrySampler():
+    """
+    Sample the telemetry of switches on a fixed cadence. Steps are scheduled on a grid
+    of period seconds from the first step, so the cadence does not drift with the RPC
+    latency; within a step every switch is queried concurrently. A step that ends past
+    the next deadline skips the deadlines it missed rather than bursting to catch up,
+    and the misses are counted and reported. A switch whose RPC fails is left out of
+    that step and counted as a failed sample.
+    """
+
+    min_period = 0.01
+
+    def __init__(self, period=1.0, workers=None):
+        self.stopped = threading.Event()
+        self.workers = workers
+        self.steps = 0
+        self.missed = 0
+        self.failed = 0
+        self.failed_lock = threading.Lock()
+        self.max_late = 0.0
+        self.set_period(period)
+
+    def set_period(self, period):
+        """Change the period in seconds, the grid restarts at the next step."""
+        assert period >= self.min_period, f"The sampling period must be at least {self.min_period * 1000:g}ms"
+        self.period = period
+        self.restart = True
+
+    def sample(self, switch, step):
+        """Sample of one switch, None when its RPC failed."""
+        start = time.time()
+        try:
+            telemetry = client_pool.call(switch, "get_telemetry")
+        except Exception as e:
+            with self.failed_lock:
+                if self.failed == 0:
+                    print(f"Telemetry sampler could not sample {switch.name}: {e!r}")
+                self.failed += 1
+            return None
+        end = time.time()
+        return Sample(switch.name, step, (start + end) / 2, end - start, telemetry)
+
+    def run(self, switches, on_step):
+        """
+        Sample switches until stop(), calling on_step(step, samples) after every step
+        from the sampling thread, samples in the order of switches without the failed
+        ones. The time on_step takes counts against the period.
+        """
+        workers = self.workers or min(32, max(len(switches), 1))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while not self.stopped.is_set():
+                if self.restart:
+                    self.restart = False
+                    origin = time.monotonic()
+                    tick = 0
+                samples = [sample for sample in pool.map(self.sample, switches, [self.steps] * len(switches))
+                           if sample is not None]
+                on_step(self.steps, samples)
+                self.steps += 1
+
+                tick += 1
+                late = time.monotonic() - (origin + tick * self.period)
+                if late > 0:
+                    missed = math.floor(late / self.period) + 1
+                    if self.missed == 0:
+                        print(f"Telemetry sampler missed its {self.period * 1000:g}ms deadline by {late * 1000:.1f}ms")
+                    self.missed += missed
+                    self.max_late = max(self.max_late, late)
+                    tick += missed
+                self.stopped.wait(max(origin + tick * self.period - time.monotonic(), 0))
+
+    def stop(self):
+        self.stopped.set()
+
+    def report(self):
+        return (f"Telemetry sampler: {self.steps} steps every {self.period * 1000:g}ms, "
+                f"{self.missed} missed deadlines" +
+                (f" (up to {self.max_late * 1000:.1f}ms late)" if self.missed else "") +
+                (f", {self.failed} failed samples" if self.failed else ""))
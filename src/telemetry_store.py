@@ -0,0 +1,191 @@
+import queue
+import threading
+
+import numpy as np
+
+POINT_DTYPE = np.dtype([("time", np.float64), ("mean", np.float32), ("max", np.float32), ("last", np.float32)])
+
+class RingBuffer():
+    """Last capacity points of a series in a preallocated array, oldest overwritten first."""
+
+    def __init__(self, capacity):
+        self.points = np.zeros(capacity, dtype=POINT_DTYPE)
+        self.head = 0
+        self.count = 0
+
+    def append(self, time, mean, peak, last):
+        self.points[self.head] = (time, mean, peak, last)
+        self.head = (self.head + 1) % len(self.points)
+        self.count = min(self.count + 1, len(self.points))
+
+    def window(self):
+        """Points in time order, a copy."""
+        if self.count < len(self.points):
+            return self.points[:self.count].copy()
+        return np.concatenate([self.points[self.head:], self.points[:self.head]])
+
+    def __len__(self):
+        return self.count
+
+
+class Series():
+    """
+    One metric of one device at every resolution of the store. Resolution 0 keeps the
+    raw samples, a resolution of r seconds averages them over buckets [k*r, (k+1)*r)
+    and keeps their maximum and last value, the latter for values like the current
+    slice that do not average. A bucket is closed by the first sample past its end.
+    """
+
+    def __init__(self, capacities):
+        self.rings = {resolution: RingBuffer(capacity) for resolution, capacity in capacities.items()}
+        # resolution -> [bucket start, sum, count, max, last]
+        self.buckets = {resolution: None for resolution in capacities if resolution > 0}
+
+    def add(self, time, value):
+        """Record a sample, returns the (resolution, bucket start, mean, max, last) buckets it closed."""
+        if 0 in self.rings:
+            self.rings[0].append(time, value, value, value)
+        closed = []
+        for resolution, bucket in self.buckets.items():
+            start = time // resolution * resolution
+            if bucket is not None and bucket[0] != start:
+                closed.append((resolution, bucket[0], bucket[1] / bucket[2], bucket[3], bucket[4]))
+                self.rings[resolution].append(*closed[-1][1:])
+                bucket = None
+            if bucket is None:
+                self.buckets[resolution] = [start, value, 1, value, value]
+            else:
+                bucket[1] += value
+                bucket[2] += 1
+                bucket[3] = max(bucket[3], value)
+                bucket[4] = value
+        return closed
+
+    def flush(self):
+        """Close the open buckets, returns them as add does."""
+        closed = []
+        for resolution, bucket in self.buckets.items():
+            if bucket is not None:
+                closed.append((resolution, bucket[0], bucket[1] / bucket[2], bucket[3], bucket[4]))
+                self.rings[resolution].append(*closed[-1][1:])
+                self.buckets[resolution] = None
+        return closed
+
+
+class TelemetryStore():
+    """
+    In-memory time series of telemetry, one Series per (metric, device), at fixed
+    resolutions in seconds with a fixed number of points each (0 for raw samples). The
+    memory of a run is bounded by the number of series, whatever its length.
+
+    The buckets closed at the resolutions in persist are queued for a persister, see
+    Persister, so the raw samples never reach the database.
+    """
+
+    default_capacities = {0: 1024, 1: 900, 10: 1080}
+
+    def __init__(self, capacities=None, persist=(1,)):
+        self.capacities = dict(capacities or self.default_capacities)
+        assert set(persist) <= set(self.capacities) - {0}, "Only downsampled resolutions can be persisted"
+        self.persist = set(persist)
+        self.series = {}
+        self.lock = threading.Lock()
+        self.closed = []
+
+    def add(self, metric, device, time, value):
+        with self.lock:
+            key = (metric, device)
+            if key not in self.series:
+                self.series[key] = Series(self.capacities)
+            self.keep(metric, device, self.series[key].add(time, value))
+
+    def keep(self, metric, device, closed):
+        for resolution, start, mean, peak, last in closed:
+            if resolution in self.persist:
+                self.closed.append((resolution, metric, device, start, mean, peak, last))
+
+    def flush(self):
+        """Close the open buckets of every series, e.g. at the end of a run."""
+        with self.lock:
+            for (metric, device), series in self.series.items():
+                self.keep(metric, device, series.flush())
+
+    def take_closed(self):
+        """(resolution, metric, device, bucket start, mean, max, last) of the persisted buckets closed since the last call."""
+        with self.lock:
+            closed, self.closed = self.closed, []
+        return closed
+
+    def window(self, metric, device, resolution=0):
+        """Points of a series at a resolution, see POINT_DTYPE; empty when it has none."""
+        with self.lock:
+            series = self.series.get((metric, device))
+            if series is None:
+                return np.zeros(0, dtype=POINT_DTYPE)
+            return series.rings[resolution].window()
+
+    def devices(self, metric):
+        with self.lock:
+            return [device for series_metric, device in self.series if series_metric == metric]
+
+    def nbytes(self):
+        with self.lock:
+            return sum(ring.points.nbytes for series in self.series.values() for ring in series.rings.values())
+
+
+class Persister():
+    """
+    Background thread that hands batches to write(batch) in order, so that the thread
+    producing them never waits on the database. Batches are lists; when the writer
+    falls behind, the batches queued meanwhile are concatenated into one write. At
+    most max_batches wait in the queue, past that the oldest one is dropped so the
+    memory stays bounded, and the drops are counted and reported.
+    close() writes what is left and stops.
+    """
+
+    def __init__(self, write, max_batches=64):
+        self.write = write
+        self.queue = queue.Queue(maxsize=max_batches)
+        self.writes = 0
+        self.dropped = 0
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, batch):
+        while True:
+            try:
+                self.queue.put_nowait(batch)
+                return
+            except queue.Full:
+                pass
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                # The writer took it meanwhile.
+                continue
+            if self.dropped == 0:
+                print(f"Telemetry persistence fell {self.queue.maxsize} batches behind, dropping the oldest")
+            self.dropped += 1
+
+    def run(self):
+        while True:
+            batches = [self.queue.get()]
+            while not self.queue.empty():
+                batches.append(self.queue.get_nowait())
+            batch = [item for queued in batches if queued is not None for item in queued]
+            if batch:
+                try:
+                    self.write(batch)
+                    self.writes += 1
+                except Exception as e:
+                    print(f"Telemetry persistence failed: {e}")
+            if None in batches:
+                return
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+    def report(self):
+        return (f"Telemetry persister: {self.writes} writes" +
+                (f", {self.dropped} batches dropped" if self.dropped else ""))
@@ -0,0 +1,62 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from routing_table import Hop, Path, RoutingTable
+
+class RangeEntriesTest(unittest.TestCase):
+
+    def test_isolated_tor(self):
+        # ToR 1 shares no circuit, so none of its destinations has a path.
+        table = RoutingTable(4, 2)
+        table.set_path(0, 3, 0, Path(0, 3, 0, [Hop(0, 1)]))
+        table.set_path(0, 2, 1, Path(0, 2, 1, [Hop(1, 1)]))
+        self.assertEqual(list(table.ssrr_entries(1)), [])
+        self.assertEqual(list(table.range_entries(1)), [])
+        self.assertEqual(table.render_ssrr(1, np.zeros((0, 2), dtype=np.int64)), [])
+
+    def test_routed_tor(self):
+        table = RoutingTable(4, 2)
+        table.set_path(0, 3, 0, Path(0, 3, 0, [Hop(0, 1)]))
+        entries = list(table.range_entries(0))
+        self.assertIn((3, 0, 0, 1, "1 0 1 0 -1 -1 0 -1 -1 0 -1 -1 0 -1 -1 255 -1 -1"), entries)
+
+    def test_ranges_match_slices(self):
+        # The lowest priority matching entry wins in bmv2, a slice no entry matches is
+        # a table miss. Either way a slice resolves to the SSRR of its own path.
+        rng = np.random.default_rng(8)
+        tor_num, slice_num = 6, 12
+        routes = [[Hop(int(rng.integers(slice_num)), int(rng.integers(1, 4))) for _ in range(rng.integers(1, 4))]
+                  for _ in range(4)]
+        table = RoutingTable(tor_num, slice_num, hop_limit=3)
+        for src in range(tor_num):
+            for dst in range(tor_num):
+                # Mostly routed, mostly unrouted and in between, so the catch-all varies.
+                routed = rng.choice([0.1, 0.5, 0.9])
+                for time_slice in range(slice_num):
+                    if src != dst and rng.random() < routed:
+                        path = routes[rng.integers(2 if dst % 2 else len(routes))]
+                        table.set_path(src, dst, time_slice, Path(src, dst, time_slice, path))
+
+        for src in range(tor_num):
+            expected = {(dst, time_slice): ssrr for dst, time_slice, ssrr in table.ssrr_entries(src)}
+            entries = list(table.range_entries(src))
+            for dst, time_slice in table.keys(src):
+                matches = [(priority, ssrr) for entry_dst, first, last, priority, ssrr in entries
+                           if entry_dst == dst and first <= time_slice <= last]
+                if matches:
+                    priority = min(priority for priority, _ in matches)
+                    winners = [ssrr for entry_priority, ssrr in matches if entry_priority == priority]
+                    self.assertEqual(len(winners), 1, (src, dst, time_slice))
+                    resolved = winners[0]
+                else:
+                    resolved = None
+                self.assertEqual(resolved, expected.get((dst, time_slice)), (src, dst, time_slice))
+
+
+
+if __name__ == "__main__":
+    unittest.main()
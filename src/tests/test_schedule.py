@@ -0,0 +1,31 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from schedule import Schedule
+
+class FromDemandTest(unittest.TestCase):
+
+    def test_every_demanded_pair_meets(self):
+        demand = np.ones((8, 8))
+        np.fill_diagonal(demand, 0)
+        demand[0, 1] = demand[2, 3] = 100
+        schedule = Schedule.from_demand(demand, 8, 1)
+        self.assertEqual(schedule.validate(), [])
+        self.assertEqual(len(schedule.analyze()["unreachable"]), 0)
+        # The hot pairs still get more than their base circuit.
+        self.assertGreater((schedule.peer[:, 0] == 1).sum(), 1)
+
+    def test_odd_tor_num(self):
+        demand = np.ones((7, 7))
+        np.fill_diagonal(demand, 0)
+        schedule = Schedule.from_demand(demand, 7, 1)
+        self.assertEqual(schedule.validate(), [])
+        self.assertEqual(len(schedule.analyze()["unreachable"]), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
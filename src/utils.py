@@ -3,6 +3,8 @@ import subprocess
 import json
 import os
 
+from table_entries import cli_text, ocs_entries, ip_to_dst_entries
+
 def load_table(cmd, cli_path, thrift_port, table_commands, print_flag=False, save_flag=False, save_name="default_name"):
 
     if save_flag == True:
@@ -19,23 +21,10 @@ def load_table(cmd, cli_path, thrift_port, table_commands, print_flag=False, sav
     os.remove('temp-commands.txt')
 
 def gen_ocs_commands(slices):
-    commands = ""
-    commands += "table_set_default ocs_schedule drop\n"
-    for slice_id, port_pairs in enumerate(slices):
-        for ingress_port, egress_port in port_pairs:
-            #ports starts from 1
-            ingress_port += 1
-            egress_port += 1
-            commands += f"table_add ocs_schedule ocs_forward {ingress_port} {slice_id} => {egress_port}\n"
-            commands += f"table_add ocs_schedule ocs_forward {egress_port} {slice_id} => {ingress_port}\n"
-    return commands
+    return cli_text(ocs_entries(slices))
 
 def gen_commands_ip_to_dst(ip_to_tor):
-    commands = ""
-    for ip, tor_id in ip_to_tor.items():
-        commands += f"table_add ip_to_dst_tor write_dst {ip} => {tor_id}\n"
-    
-    return commands
+    return cli_text(ip_to_dst_entries(ip_to_tor))
 
 def gen_tor_commands(tor_id, slices, port_to_ip, num_hosts, offset):
     """
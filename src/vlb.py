@@ -1,7 +1,18 @@
 from OpticalToolbox import BaseNetwork
 
 if __name__ == "__main__":
-    net = BaseNetwork("vlb")
+    root=""
+    net = BaseNetwork(name="vlb",
+                      ocs_sw_path=f"{root}/openoptics-mininet/behavioral-model/targets/optical_switch/optical_switch",
+                      ocs_json_path=f"{root}/openoptics-mininet/p4/ocs/ocs.json",
+                      ocs_cli_path=f"{root}/openoptics-mininet/behavioral-model/targets/simple_switch/runtime_CLI",
+                      tor_sw_path=f"{root}/openoptics-mininet/behavioral-model/targets/tor_switch/tor_switch",
+                      tor_json_path=f"{root}/openoptics-mininet/p4/tor/tor.json",
+                      tor_cli_path=f"{root}/openoptics-mininet/behavioral-model/targets/simple_switch/runtime_CLI",
+                      use_webserver=False)
     net.round_robin(tor_num = 8, port_num = 1)
+    # "earliest" | "round_robin" | "hashed" | "least_wait"
+    net.set_vlb_policy("earliest")
     net.routing(net.routing_vlb)
-    net.start(mode = "Testbed")
\ No newline at end of file
+    net.entries(lookup_type="SOURCE")
+    net.start(mode = "Mininet")
@@ -200,13 +200,15 @@ class OpticalSwitch::InputBuffer {
 
 OpticalSwitch::OpticalSwitch(bool enable_swap, port_t drop_port,
                            size_t nb_queues_per_port,
-                           size_t nb_time_slices)
+                           size_t nb_time_slices,
+                           uint64_t slice_duration_us)
   : Switch(enable_swap),
     drop_port(drop_port),
     input_buffer(new InputBuffer(
         1024 /* normal capacity */, 1024 /* resubmit/recirc capacity */)),
     nb_queues_per_port(nb_queues_per_port),
     nb_time_slices(nb_time_slices),
+    slice_duration_us(slice_duration_us),
     egress_buffers(nb_egress_threads,
                    64, EgressThreadMapper(nb_egress_threads),
                    nb_queues_per_port),
@@ -378,6 +380,18 @@ OpticalSwitch::get_time_since_epoch_us() const {
   return duration_cast<ts_res>(tp.time_since_epoch()).count();
 }
 
+int
+OpticalSwitch::set_slice_duration_us(const uint64_t duration_us) {
+  if (duration_us == 0) return 1;
+  slice_duration_us.store(duration_us, std::memory_order_relaxed);
+  return 0;
+}
+
+uint64_t
+OpticalSwitch::get_slice_duration_us() const {
+  return slice_duration_us.load(std::memory_order_relaxed);
+}
+
 void
 OpticalSwitch::set_transmit_fn(TransmitFn fn) {
   my_transmit_fn = std::move(fn);
@@ -480,7 +494,7 @@ OpticalSwitch::multicast(Packet *packet, unsigned int mgid) {
 
 size_t 
 OpticalSwitch::ts2time_slice(int64_t current_time) {
-  return ((current_time & 0x0000FFFFFFFFFFFF) >> 15) % nb_time_slices; // one slice per second
+  return ((current_time & 0x0000FFFFFFFFFFFF) / slice_duration_us.load(std::memory_order_relaxed)) % nb_time_slices;
 }
 
 void
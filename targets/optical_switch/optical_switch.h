@@ -28,6 +28,7 @@
 #include <bm/bm_sim/event_logger.h>
 #include <bm/bm_sim/simple_pre_lag.h>
 
+#include <atomic>
 #include <memory>
 #include <chrono>
 #include <thread>
@@ -75,6 +76,8 @@ class OpticalSwitch : public Switch {
 
   static constexpr port_t default_drop_port = 511;
   static constexpr size_t default_nb_queues_per_port = 1;
+  // 2^15us, about 32.8ms
+  static constexpr uint64_t default_slice_duration_us = 1 << 15;
   static constexpr size_t default_nb_time_slices = 1;
 
  private:
@@ -85,7 +88,8 @@ class OpticalSwitch : public Switch {
   explicit OpticalSwitch(bool enable_swap = false,
                         port_t drop_port = default_drop_port,
                         size_t nb_queues_per_port = default_nb_queues_per_port,
-                        size_t nb_time_slices = default_nb_time_slices);
+                        size_t nb_time_slices = default_nb_time_slices,
+                        uint64_t slice_duration_us = default_slice_duration_us);
 
   ~OpticalSwitch();
 
@@ -121,6 +125,10 @@ class OpticalSwitch : public Switch {
   // returns the number of microseconds elasped since the clock's epoch
   uint64_t get_time_since_epoch_us() const;
 
+  // duration of a time slice, can be changed while the switch runs
+  int set_slice_duration_us(const uint64_t duration_us);
+  uint64_t get_slice_duration_us() const;
+
   // returns the packet id of most recently received packet. Not thread-safe.
   static packet_id_t get_packet_id() {
     return packet_id - 1;
@@ -194,6 +202,7 @@ class OpticalSwitch : public Switch {
   // packet if the queue is full
   size_t nb_queues_per_port;
   size_t nb_time_slices;
+  std::atomic<uint64_t> slice_duration_us;
   bm::QueueingLogicPriRL<std::unique_ptr<Packet>, EgressThreadMapper>
   egress_buffers;
   Queue<std::unique_ptr<Packet> > output_buffer;
@@ -129,6 +129,20 @@ class OpticalSwitchAPI(runtime_CLI.RuntimeAPI):
         "Get time elapsed (in microseconds) since the switch clock's epoch: get_time_since_epoch"
         print(self.sswitch_client.get_time_since_epoch_us())
 
+    @handle_bad_input
+    def do_set_slice_duration(self, line):
+        "Set the duration of a time slice (in microseconds): set_slice_duration <duration_us>"
+        args = line.split()
+        self.exactly_n_args(args, 1)
+        duration = self.parse_int(args[0], "duration_us")
+        if self.sswitch_client.set_slice_duration_us(duration) != 0:
+            print("Invalid slice duration %d" % duration)
+
+    @handle_bad_input
+    def do_get_slice_duration(self, line):
+        "Get the duration of a time slice (in microseconds): get_slice_duration"
+        print(self.sswitch_client.get_slice_duration_us())
+
 def main():
     args = runtime_CLI.get_parser().parse_args()
 
@@ -60,4 +60,7 @@ service OpticalSwitch {
   i64 get_time_elapsed_us();
   i64 get_time_since_epoch_us();
 
+  i32 set_slice_duration_us(1:i64 duration_us);
+  i64 get_slice_duration_us();
+
 }
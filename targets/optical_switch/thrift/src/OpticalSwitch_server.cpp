@@ -157,6 +157,17 @@ class OpticalSwitchHandler : virtual public OpticalSwitchIf {
     return static_cast<int64_t>(switch_->get_time_since_epoch_us());
   }
 
+  int32_t set_slice_duration_us(const int64_t duration_us) {
+    bm::Logger::get()->trace("set_slice_duration_us");
+    if (duration_us <= 0) return 1;
+    return switch_->set_slice_duration_us(static_cast<uint64_t>(duration_us));
+  }
+
+  int64_t get_slice_duration_us() {
+    bm::Logger::get()->trace("get_slice_duration_us");
+    return static_cast<int64_t>(switch_->get_slice_duration_us());
+  }
+
  private:
   OpticalSwitch *switch_;
 };
@@ -162,6 +162,17 @@ class CalendarQueue {
     LockType lock(mutex);
     return overal_qdepth;
   }
+  //! Occupancy of every (port, calendar queue) seen so far, as (port id,
+  //! queue id, size), all taken under the same lock.
+  std::vector<std::tuple<size_t, size_t, size_t>> get_q_sizes() const {
+    LockType lock(mutex);
+    std::vector<std::tuple<size_t, size_t, size_t>> sizes;
+    sizes.reserve(port_q_info.size());
+    for (const auto& entry : port_q_info) {
+      sizes.emplace_back(entry.first.first, entry.first.second, entry.second.size);
+    }
+    return sizes;
+  }
   std::vector<std::pair<size_t, size_t>> get_port_qs() const {
     std::vector<std::pair<size_t, size_t>> keys;
     for (const auto& key : port_q_info) {
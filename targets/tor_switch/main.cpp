@@ -52,6 +52,9 @@ main(int argc, char* argv[]) {
   tor_switch_parser.add_uint_option(
       "calendar-queues",
       "Number of calendar queues (default is 0)");
+  tor_switch_parser.add_uint_option(
+      "slice-duration-us",
+      "Duration of a time slice in microseconds (default is 32768)");
 
   bm::OptionsParser parser;
   parser.parse(argc, argv, &tor_switch_parser);
@@ -91,9 +94,20 @@ main(int argc, char* argv[]) {
       std::exit(1);
   }
 
+  uint32_t slice_duration_us = 0xffffffff;
+  {
+    auto rc = tor_switch_parser.get_uint_option(
+        "slice-duration-us", &slice_duration_us);
+    if (rc == bm::TargetParserBasic::ReturnCode::OPTION_NOT_PROVIDED)
+      slice_duration_us = TorSwitch::default_slice_duration_us;
+    else if (rc != bm::TargetParserBasic::ReturnCode::SUCCESS || slice_duration_us == 0)
+      std::exit(1);
+  }
+
   tor_switch = new TorSwitch(enable_swap_flag, drop_port,
                                    priority_queues,
-                                   calendar_queues);
+                                   calendar_queues,
+                                   slice_duration_us);
 
   int status = tor_switch->init_from_options_parser(parser);
   if (status != 0) std::exit(status);
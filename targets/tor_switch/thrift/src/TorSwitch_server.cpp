@@ -157,6 +157,17 @@ class TorSwitchHandler : virtual public TorSwitchIf {
     return static_cast<int64_t>(switch_->get_time_since_epoch_us());
   }
 
+  int32_t set_slice_duration_us(const int64_t duration_us) {
+    bm::Logger::get()->trace("set_slice_duration_us");
+    if (duration_us <= 0) return 1;
+    return switch_->set_slice_duration_us(static_cast<uint64_t>(duration_us));
+  }
+
+  int64_t get_slice_duration_us() {
+    bm::Logger::get()->trace("get_slice_duration_us");
+    return static_cast<int64_t>(switch_->get_slice_duration_us());
+  }
+
   void get_num_queued_packets(std::string& _return) {
     bm::Logger::get()->trace("get_num_queued_packets");
     switch_->get_num_queued_packets(_return);
@@ -167,6 +178,23 @@ class TorSwitchHandler : virtual public TorSwitchIf {
     switch_->get_packet_loss_rate(_return);
   }
 
+  void get_telemetry(Telemetry& _return) {
+    bm::Logger::get()->trace("get_telemetry");
+    TorSwitch::Telemetry telemetry;
+    switch_->get_telemetry(&telemetry);
+    int64_t total = 0;
+    for (const auto &q : telemetry.queue_depths) {
+      _return.queue_depths[static_cast<int32_t>(std::get<0>(q))]
+                          [static_cast<int32_t>(std::get<1>(q))] = std::get<2>(q);
+      total += std::get<2>(q);
+    }
+    _return.total_queued = total;
+    _return.packets_received = static_cast<int64_t>(telemetry.nb_pkts_rcvd);
+    _return.packets_dropped = static_cast<int64_t>(telemetry.nb_pkts_dropped);
+    _return.time_us = static_cast<int64_t>(telemetry.time_us);
+    _return.time_slice = static_cast<int32_t>(telemetry.time_slice);
+  }
+
  private:
   TorSwitch *switch_;
 };
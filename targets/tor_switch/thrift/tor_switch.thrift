@@ -34,6 +34,17 @@ exception InvalidMirroringOperation {
   1:MirroringOperationErrorCode code;
 }
 
+struct Telemetry {
+  // egress port -> calendar queue -> queued packets
+  1:map<i32, map<i32, i64>> queue_depths;
+  2:i64 total_queued;
+  3:i64 packets_received;
+  4:i64 packets_dropped;
+  // switch time (see get_time_elapsed_us) and time slice of the snapshot
+  5:i64 time_us;
+  6:i32 time_slice;
+}
+
 service TorSwitch {
 
   // deprecated, use the mirroring_session_* RPCs instead
@@ -60,6 +71,11 @@ service TorSwitch {
   i64 get_time_elapsed_us();
   i64 get_time_since_epoch_us();
 
+  i32 set_slice_duration_us(1:i64 duration_us);
+  i64 get_slice_duration_us();
+
   string get_num_queued_packets();
   string get_packet_loss_rate();
+
+  Telemetry get_telemetry();
 }
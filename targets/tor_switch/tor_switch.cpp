@@ -200,13 +200,15 @@ class TorSwitch::InputBuffer {
 
 TorSwitch::TorSwitch(bool enable_swap, port_t drop_port,
                            size_t nb_queues_per_port,
-                          size_t nb_calendar_queues)
+                          size_t nb_calendar_queues,
+                          uint64_t slice_duration_us)
   : Switch(enable_swap),
     drop_port(drop_port),
     input_buffer(new InputBuffer(
         1024 /* normal capacity */, 1024 /* resubmit/recirc capacity */)),
     nb_queues_per_port(nb_queues_per_port),
     nb_calendar_queues(nb_calendar_queues),
+    slice_duration_us(slice_duration_us),
     
     egress_buffers(nb_egress_threads,
                    64, EgressThreadMapper(nb_egress_threads),
@@ -387,6 +389,18 @@ TorSwitch::get_time_since_epoch_us() const {
   return duration_cast<ts_res>(tp.time_since_epoch()).count();
 }
 
+int
+TorSwitch::set_slice_duration_us(const uint64_t duration_us) {
+  if (duration_us == 0) return 1;
+  slice_duration_us.store(duration_us, std::memory_order_relaxed);
+  return 0;
+}
+
+uint64_t
+TorSwitch::get_slice_duration_us() const {
+  return slice_duration_us.load(std::memory_order_relaxed);
+}
+
 void
 TorSwitch::get_num_queued_packets(std::string& _return) const {
   std::string output;
@@ -414,6 +428,15 @@ TorSwitch::get_packet_loss_rate(std::string& _return) const {
   _return = output;
 }
 
+void
+TorSwitch::get_telemetry(Telemetry *telemetry) {
+  telemetry->queue_depths = egress_cq_buffers.get_q_sizes();
+  telemetry->nb_pkts_rcvd = nb_pkts_rcvd;
+  telemetry->nb_pkts_dropped = nb_pkts_dropped;
+  telemetry->time_us = get_ts().count();
+  telemetry->time_slice = ts2time_slice(telemetry->time_us);
+}
+
 void
 TorSwitch::set_transmit_fn(TransmitFn fn) {
   my_transmit_fn = std::move(fn);
@@ -748,7 +771,7 @@ TorSwitch::ingress_thread() {
 
 size_t 
 TorSwitch::ts2time_slice(int64_t current_time) {
-  return ((current_time & 0x0000FFFFFFFFFFFF) >> 15) % nb_calendar_queues; // one slice per second
+  return ((current_time & 0x0000FFFFFFFFFFFF) / slice_duration_us.load(std::memory_order_relaxed)) % nb_calendar_queues;
 }
 
 void
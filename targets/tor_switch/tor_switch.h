@@ -30,11 +30,13 @@
 
 #include "calendar_queue.h"
 
+#include <atomic>
 #include <memory>
 #include <chrono>
 #include <thread>
 #include <vector>
 #include <functional>
+#include <tuple>
 
 // TODO(antonin)
 // experimental support for priority queueing
@@ -75,8 +77,19 @@ class TorSwitch : public Switch {
     bool mgid_valid;
   };
 
+  struct Telemetry {
+    // (egress port, calendar queue, queued packets)
+    std::vector<std::tuple<size_t, size_t, size_t> > queue_depths;
+    uint64_t nb_pkts_rcvd;
+    uint64_t nb_pkts_dropped;
+    uint64_t time_us;
+    size_t time_slice;
+  };
+
   static constexpr port_t default_drop_port = 511;
   static constexpr size_t default_nb_queues_per_port = 1;
+  // 2^15us, about 32.8ms
+  static constexpr uint64_t default_slice_duration_us = 1 << 15;
   static constexpr size_t default_calendar_queues_per_port = 0;
 
  private:
@@ -87,7 +100,8 @@ class TorSwitch : public Switch {
   explicit TorSwitch(bool enable_swap = false,
                         port_t drop_port = default_drop_port,
                         size_t nb_queues_per_port = default_nb_queues_per_port,
-                        size_t nb_calender_queues = default_calendar_queues_per_port);
+                        size_t nb_calender_queues = default_calendar_queues_per_port,
+                        uint64_t slice_duration_us = default_slice_duration_us);
 
   ~TorSwitch();
 
@@ -123,10 +137,17 @@ class TorSwitch : public Switch {
   // returns the number of microseconds elasped since the clock's epoch
   uint64_t get_time_since_epoch_us() const;
 
+  // duration of a time slice, can be changed while the switch runs
+  int set_slice_duration_us(const uint64_t duration_us);
+  uint64_t get_slice_duration_us() const;
+
   void get_num_queued_packets(std::string& _return) const;
 
   void get_packet_loss_rate(std::string& _return) const;
 
+  // queue depths and packet counters in one snapshot
+  void get_telemetry(Telemetry *telemetry);
+
   // returns the packet id of most recently received packet. Not thread-safe.
   static packet_id_t get_packet_id() {
     return packet_id - 1;
@@ -203,6 +224,7 @@ class TorSwitch : public Switch {
   // packet if the queue is full
   size_t nb_queues_per_port;
   size_t nb_calendar_queues;
+  std::atomic<uint64_t> slice_duration_us;
   bm::QueueingLogicPriRL<std::unique_ptr<Packet>, EgressThreadMapper> egress_buffers;
   CalendarQueue<std::unique_ptr<Packet> > egress_cq_buffers;
   Queue<std::unique_ptr<Packet> > output_buffer;
@@ -128,6 +128,20 @@ class TorSwitchAPI(runtime_CLI.RuntimeAPI):
     def do_get_time_since_epoch(self, line):
         "Get time elapsed (in microseconds) since the switch clock's epoch: get_time_since_epoch"
         print(self.sswitch_client.get_time_since_epoch_us())
+
+    @handle_bad_input
+    def do_set_slice_duration(self, line):
+        "Set the duration of a time slice (in microseconds): set_slice_duration <duration_us>"
+        args = line.split()
+        self.exactly_n_args(args, 1)
+        duration = self.parse_int(args[0], "duration_us")
+        if self.sswitch_client.set_slice_duration_us(duration) != 0:
+            print("Invalid slice duration %d" % duration)
+
+    @handle_bad_input
+    def do_get_slice_duration(self, line):
+        "Get the duration of a time slice (in microseconds): get_slice_duration"
+        print(self.sswitch_client.get_slice_duration_us())
     
     @handle_bad_input
     def do_get_num_queued_packets(self, line):
@@ -139,6 +153,18 @@ class TorSwitchAPI(runtime_CLI.RuntimeAPI):
         "Get rate of packet loss"
         print(self.sswitch_client.get_packet_loss_rate())
 
+    @handle_bad_input
+    def do_get_telemetry(self, line):
+        "Get queue depths and packet counters in one snapshot: get_telemetry"
+        telemetry = self.sswitch_client.get_telemetry()
+        print("time: %dus, slice: %d" % (telemetry.time_us, telemetry.time_slice))
+        for port, queues in sorted(telemetry.queue_depths.items()):
+            for queue, depth in sorted(queues.items()):
+                print("(%d,%d): %d" % (port, queue, depth))
+        print("total: %d" % telemetry.total_queued)
+        print("Received: %d" % telemetry.packets_received)
+        print("Dropped: %d" % telemetry.packets_dropped)
+
 def main():
     args = runtime_CLI.get_parser().parse_args()
 